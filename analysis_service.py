@@ -0,0 +1,454 @@
+"""
+Local signature analysis service.
+
+One long-running process keeps warm, supervised analysis workers (see
+isolated_runner) and accepts jobs over HTTP on localhost or a Unix socket,
+so the Streamlit app, batch scripts and other tools share a single pool:
+
+    python analysis_service.py --port 8765
+    python analysis_service.py --unix-socket /tmp/pbsa.sock
+
+API (JSON responses):
+    POST /jobs                 body: PDF bytes, or {"path": "..."} as JSON; options as query
+                               parameters (text_backend, verify_signatures, visual_ink_pages,
+                               include_timings, name). 202 with the job, or 503 + Retry-After
+                               when the queue is full.
+    GET  /jobs/<id>            current state; 'record' holds the result once finished
+    GET  /jobs/<id>/events     newline-delimited JSON stream of state changes until finished
+    DELETE /jobs/<id>          cancel a job that has not started
+    GET  /health               queue length, workers and job counts
+
+AnalysisClient is a small blocking client for the same API.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Any, Optional
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from isolated_runner import DEFAULT_MAX_RSS_MB, DEFAULT_TIMEOUT, IsolatedAnalyzer
+from pdf_processor import TEXT_BACKENDS, PdfSource, results_json_default
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 64
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+# Finished jobs kept for polling before the oldest are forgotten
+KEEP_FINISHED_JOBS = 1000
+# Seconds a rejected client is asked to wait before resubmitting
+RETRY_AFTER = 2
+
+FINISHED_STATES = {'ok', 'error', 'timeout', 'memory_limit', 'crashed', 'cancelled'}
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def _parse_options(query: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Analysis options from query parameters; raises ValueError on bad values."""
+    options = {}
+    if 'text_backend' in query:
+        options['text_backend'] = query['text_backend'][0]
+        if options['text_backend'] not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend '{options['text_backend']}'")
+    for flag in ('verify_signatures', 'include_timings'):
+        if flag in query:
+            options[flag] = query[flag][0].lower() in ('1', 'true', 'yes')
+    if 'visual_ink_pages' in query:
+        options['visual_ink_pages'] = int(query['visual_ink_pages'][0])
+    return options
+
+
+class Job:
+    """One submitted document and its progress."""
+
+    def __init__(self, source: PdfSource, name: str, options: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.name = name
+        self.options = options
+        self.status = 'queued'
+        self.submitted_at = datetime.now().isoformat(timespec="seconds")
+        self.started_at = None
+        self.finished_at = None
+        self.record = None
+        self.changed = asyncio.Event()
+
+    def update(self, status: str, record: Dict[str, Any] = None) -> None:
+        self.status = status
+        if status == 'running':
+            self.started_at = datetime.now().isoformat(timespec="seconds")
+        if status in FINISHED_STATES:
+            self.finished_at = datetime.now().isoformat(timespec="seconds")
+            self.record = record
+            self.source = None
+        # Wake everyone waiting on this change, then arm a fresh event for the next one
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'job_id': self.id, 'name': self.name, 'status': self.status, 'options': self.options,
+                'submitted_at': self.submitted_at, 'started_at': self.started_at,
+                'finished_at': self.finished_at, 'record': self.record}
+
+
+class AnalysisService:
+    """
+    Bounded job queue in front of supervised analysis workers.
+    Each of `workers` dispatchers owns a one-process IsolatedAnalyzer, so
+    workers stay warm between jobs and a hung or runaway document is stopped
+    without affecting the others.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = DEFAULT_QUEUE_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 max_rss_mb: float = DEFAULT_MAX_RSS_MB, use_cache: bool = True):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.analyzer_options = {'timeout': timeout, 'max_rss_mb': max_rss_mb, 'use_cache': use_cache}
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.started = time.time()
+        self._queue: Optional[asyncio.Queue] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._analyzers: List[IsolatedAnalyzer] = []
+        self._dispatchers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Create the queue and start the dispatchers; call from the running loop."""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-dispatch")
+        for _ in range(self.workers):
+            analyzer = IsolatedAnalyzer(workers=1, **self.analyzer_options)
+            self._analyzers.append(analyzer)
+            self._dispatchers.append(asyncio.create_task(self._dispatch(analyzer)))
+
+    async def close(self) -> None:
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._threads.shutdown(wait=True)
+        for analyzer in self._analyzers:
+            analyzer.close()
+
+    def submit(self, source: PdfSource, name: str, options: Dict[str, Any]) -> Job:
+        """Queue a job; raises asyncio.QueueFull when the queue is at capacity."""
+        job = Job(source, name, options)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self._forget_old_jobs()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job; returns False if it already started."""
+        job = self.jobs[job_id]
+        if job.status != 'queued':
+            return False
+        job.update('cancelled')
+        return True
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - KEEP_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _dispatch(self, analyzer: IsolatedAnalyzer) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == 'cancelled':
+                    continue
+                job.update('running')
+                record = await loop.run_in_executor(self._threads, lambda: analyzer.analyze(job.source, job.name,
+                                                                                            **job.options))
+                job.update(record['status'], record)
+            except Exception as e:
+                logger.error("❌ Error running job %s: %s", job.id, e)
+                job.update('error', {'file': job.name, 'status': 'error', 'error': str(e)})
+            finally:
+                self._queue.task_done()
+
+    def health(self) -> Dict[str, Any]:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'status': 'ok', 'workers': self.workers, 'queued': self._queue.qsize(), 'queue_size': self.queue_size,
+                'jobs': counts, 'uptime_seconds': round(time.time() - self.started, 1)}
+
+    # HTTP
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one request per connection."""
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) != 3:
+                return
+            method, target, _ = request_line
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length', 0))
+            if length > MAX_UPLOAD_BYTES:
+                await self._respond(writer, 413, {'error': f"Upload larger than {MAX_UPLOAD_BYTES} bytes"})
+                return
+            body = await reader.readexactly(length) if length else b""
+            await self._route(method, urlsplit(target), headers, body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error("❌ Error handling request: %s", e)
+            try:
+                await self._respond(writer, 400, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, url, headers: Dict[str, str], body: bytes, writer) -> None:
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ['health'] and method == 'GET':
+            await self._respond(writer, 200, self.health())
+        elif parts == ['jobs'] and method == 'POST':
+            await self._submit(parse_qs(url.query), headers, body, writer)
+        elif len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                await self._respond(writer, 404, {'error': f"Unknown job {parts[1]}"})
+            elif len(parts) == 2 and method == 'GET':
+                await self._respond(writer, 200, job.to_dict())
+            elif len(parts) == 2 and method == 'DELETE':
+                if self.cancel(job.id):
+                    await self._respond(writer, 200, job.to_dict())
+                else:
+                    await self._respond(writer, 409, {'error': f"Job {job.id} is already {job.status}"})
+            elif parts[2:] == ['events'] and method == 'GET':
+                await self._stream(job, writer)
+            else:
+                await self._respond(writer, 405, {'error': f"{method} not supported here"})
+        else:
+            await self._respond(writer, 404, {'error': f"No route for {method} {url.path}"})
+
+    async def _submit(self, query: Dict[str, List[str]], headers: Dict[str, str], body: bytes, writer) -> None:
+        try:
+            options = _parse_options(query)
+        except ValueError as e:
+            await self._respond(writer, 400, {'error': str(e)})
+            return
+        if headers.get('content-type', '').startswith('application/json'):
+            path = json.loads(body or b"{}").get('path')
+            if not path or not os.path.isfile(path):
+                await self._respond(writer, 400, {'error': f"No such file: {path}"})
+                return
+            source, name = os.path.abspath(path), query.get('name', [path])[0]
+        elif body:
+            source, name = body, query.get('name', ["upload.pdf"])[0]
+        else:
+            await self._respond(writer, 400, {'error': "Send PDF bytes or {\"path\": ...} as JSON"})
+            return
+
+        try:
+            job = self.submit(source, name, options)
+        except asyncio.QueueFull:
+            await self._respond(writer, 503, {'error': "Queue is full, retry later", 'queued': self._queue.qsize()},
+                                {'Retry-After': str(RETRY_AFTER)})
+            return
+        await self._respond(writer, 202, job.to_dict(), {'Location': f"/jobs/{job.id}"})
+
+    async def _stream(self, job: Job, writer) -> None:
+        """Send the job state now and after every change, as chunked NDJSON."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        while True:
+            changed = job.changed
+            line = json.dumps(job.to_dict(), default=results_json_default).encode() + b"\n"
+            writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            await writer.drain()
+            if job.status in FINISHED_STATES:
+                break
+            await changed.wait()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _respond(self, writer, status: int, payload: Dict[str, Any], extra_headers: Dict[str, str] = None):
+        body = json.dumps(payload, default=results_json_default).encode()
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{key}: {value}" for key, value in (extra_headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+
+async def serve(service: AnalysisService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                unix_socket: str = None) -> None:
+    """Run the service until cancelled; documents already being analyzed are finished first."""
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_socket)
+        where = unix_socket
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        where = f"http://{host}:{port}"
+    await service.start()
+    try:
+        # A service manager's SIGTERM stops the service like Ctrl-C, so workers are shut down
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    print(f"✅ Analysis service on {where} with {service.workers} workers", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+class ServiceBusy(Exception):
+    """The service queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"analysis service is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class AnalysisClient:
+    """
+    Blocking client for the service.
+    Args:
+        address (str): "http://127.0.0.1:8765" or "unix:/path/to/socket".
+        timeout (float): Socket timeout for each request.
+    """
+
+    def __init__(self, address: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 30):
+        self.address = address
+        self.timeout = timeout
+
+    def _connection(self, timeout: float = None) -> http.client.HTTPConnection:
+        timeout = self.timeout if timeout is None else timeout
+        if self.address.startswith("unix:"):
+            return _UnixHTTPConnection(self.address[len("unix:"):], timeout)
+        url = urlsplit(self.address)
+        return http.client.HTTPConnection(url.hostname, url.port or DEFAULT_PORT, timeout=timeout)
+
+    def _request(self, method: str, path: str, body: bytes = None, headers: Dict[str, str] = None) -> Dict[str, Any]:
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status == 503:
+            raise ServiceBusy(float(response.getheader("Retry-After", RETRY_AFTER)))
+        if response.status >= 400:
+            raise RuntimeError(f"❌ Analysis service error {response.status}: {payload.get('error')}")
+        return payload
+
+    def submit(self, source: PdfSource, name: str = None, **options) -> Dict[str, Any]:
+        """Queue a document (a path on this machine, or its bytes); returns the job. Raises ServiceBusy."""
+        query = {key: str(value).lower() if isinstance(value, bool) else value for key, value in options.items()}
+        if name:
+            query['name'] = name
+        path = "/jobs" + ("?" + urlencode(query) if query else "")
+        if isinstance(source, str):
+            body, content_type = json.dumps({'path': os.path.abspath(source)}).encode(), "application/json"
+        else:
+            body, content_type = bytes(source), "application/pdf"
+        return self._request("POST", path, body, {'Content-Type': content_type})
+
+    def get(self, job_id: str) -> Dict[str, Any]:
+        """Current state of a job."""
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Cancel a job that has not started."""
+        return self._request("DELETE", f"/jobs/{job_id}")
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def events(self, job_id: str, timeout: float = None) -> Iterator[Dict[str, Any]]:
+        """Yield the job's state on every change until it finishes."""
+        conn = self._connection(timeout)
+        try:
+            conn.request("GET", f"/jobs/{job_id}/events")
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"❌ Analysis service error {response.status}: {response.read()!r}")
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+    def wait(self, job_id: str, timeout: float = None) -> Dict[str, Any]:
+        """Block until the job finishes and return its final state."""
+        job = None
+        for job in self.events(job_id, timeout):
+            pass
+        return job
+
+    def analyze(self, source: PdfSource, name: str = None, **options) -> Dict[str, Any]:
+        """Submit (waiting out a full queue) and return the finished job's record."""
+        while True:
+            try:
+                job = self.submit(source, name, **options)
+                break
+            except ServiceBusy as busy:
+                time.sleep(busy.retry_after)
+        return self.wait(job['job_id'])['record']
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local PDF signature analysis service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="jobs waiting beyond this are rejected with 503")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="wall-clock limit per document")
+    parser.add_argument("--max-rss", type=float, default=DEFAULT_MAX_RSS_MB, help="memory limit per worker in MB")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the shared result cache")
+    parser.add_argument("--log-level", default="WARNING", help="logging level (e.g. DEBUG)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    service = AnalysisService(args.workers, args.queue_size, args.timeout, args.max_rss, not args.no_cache)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,80 +1,243 @@
 import streamlit as st
+import hashlib
+import logging
 import os
-from datetime import datetime
-import pandas as pd
-from excel_processor import *
-from pdf_processor import analyze_pdf_signatures, detect_signatures_multiple_methods
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from evidence_store import get_default_store
+from audit_db import get_default_db
+# pandas, PyMuPDF and pdfplumber are most of a cold start, so excel_processor, pdf_processor,
+# result_cache, isolated_runner, analysis_service and coverage_report are imported where first
+# used; later reruns find them already loaded
 
+logger = logging.getLogger(__name__)
 
-# Set up directories
-UPLOAD_DIR = "uploads"
-PREPARED_DOCS_DIR = os.path.join(UPLOAD_DIR, "prepared_docs")
-COMPLIANCE_GUIDELINES_DIR = os.path.join(UPLOAD_DIR, "compliance_guidelines")
 
-for directory in [UPLOAD_DIR, PREPARED_DOCS_DIR, COMPLIANCE_GUIDELINES_DIR]:
-    os.makedirs(directory, exist_ok=True)
+# Upload kinds recorded in the evidence store (files live under uploads/store)
+PREPARED_DOCS = "prepared_docs"
+COMPLIANCE_GUIDELINES = "compliance_guidelines"
 
-def save_uploaded_file(uploaded_file, directory):
-    """Save uploaded file to specified directory and return the file path."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{uploaded_file.name}"
-    file_path = os.path.join(directory, filename)
+# Upper bound on concurrent analyses per "Process PDF Evidence" click
+ANALYSIS_WORKERS = min(4, os.cpu_count() or 1)
+# Options every evidence analysis runs with; also the result cache key
+# (text_backend is pdf_processor.DEFAULT_TEXT_BACKEND, spelled out so startup does not load the PDF stack)
+ANALYSIS_OPTIONS = {"text_backend": "pymupdf", "verify_signatures": True}
+# Pages rendered per document by the ink signature scan (ink_detector.py) when it is switched on in the sidebar
+VISUAL_INK_PAGES = 10
+# Per-file limits, so one malformed upload cannot hold up the page
+ANALYSIS_TIMEOUT = 120
+ANALYSIS_MAX_RSS_MB = 2048
+# Shared analysis service (analysis_service.py), e.g. "http://127.0.0.1:8765" or "unix:/tmp/pbsa.sock";
+# unset to analyze in this process's own workers
+ANALYSIS_SERVICE = os.environ.get("PBSA_ANALYSIS_SERVICE")
+# Larger coverage matrices are offered as a download only; the browser table would be too slow
+COVERAGE_MATRIX_DISPLAY_COLUMNS = 300
 
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+def save_uploaded_file(uploaded_file, kind, clause=None, sha256=None):
+    """Store uploaded file (deduplicated by content) and return the file path."""
+    return get_default_store().put(uploaded_file.getbuffer(), uploaded_file.name, kind, clause, sha256=sha256)["path"]
+
+@st.cache_resource(max_entries=8)
+def get_guideline(sha256, _path):
+    """Parsed guideline shared by all sessions and reruns, keyed on the file hash only."""
+    from excel_processor import load_guideline
+    return load_guideline(_path)
+
+@st.cache_data(max_entries=4, show_spinner="Building coverage report...")
+def get_coverage_report(revision):
+    """Coverage tables, Excel workbook and the tables too wide for it, for one state of the audit database."""
+    from coverage_report import build_coverage_report
+    report = build_coverage_report(get_default_db())
+    return report.summary, report.status, report.matrix, report.excel_bytes(), report.excel_omitted
+
+@st.cache_resource
+def get_persist_pool():
+    """Background writer shared across reruns, so saving audit copies stays off the request path."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="persist-upload")
+
+def _store_upload(uploaded_file, kind, clause, sha256):
+    data = uploaded_file.getbuffer()
+    try:
+        get_default_store().put(data, uploaded_file.name, kind, clause, sha256=sha256)
+    except Exception as e:
+        logger.error("❌ Error saving upload '%s': %s", uploaded_file.name, e)
+    finally:
+        data.release()
+
+def save_uploaded_file_async(uploaded_file, kind, clause, sha256):
+    """Queue the upload to be stored in the background and return the path its blob will have."""
+    file_path = get_default_store().blob_path(sha256, os.path.splitext(uploaded_file.name)[1])
+    get_persist_pool().submit(_store_upload, uploaded_file, kind, clause, sha256)
     return file_path
 
-# Initialize session state
+def analysis_options():
+    """ANALYSIS_OPTIONS plus the optional detection methods switched on in the sidebar."""
+    if st.session_state.get("visual_ink"):
+        return {**ANALYSIS_OPTIONS, "visual_ink_pages": VISUAL_INK_PAGES}
+    return ANALYSIS_OPTIONS
+
+def analyze_pending_docs(sources, names, options):
+    """
+    Analyze cache misses, yielding (position, record) as each finishes. Uses the shared
+    analysis service when ANALYSIS_SERVICE is set, and local supervised workers otherwise
+    or for any file the service could not be reached for, failed or did not finish.
+    """
+    remaining = set(range(len(sources)))
+    if ANALYSIS_SERVICE:
+        from http.client import HTTPException
+        from analysis_service import AnalysisClient
+        # No socket timeout: a job may wait in the queue, and the service enforces ANALYSIS_TIMEOUT itself
+        client = AnalysisClient(ANALYSIS_SERVICE, timeout=None)
+        problem = None
+        with ThreadPoolExecutor(max_workers=min(ANALYSIS_WORKERS, len(sources))) as pool:
+            futures = {pool.submit(client.analyze, sources[position], names[position], **options): position
+                       for position in remaining}
+            for future in as_completed(futures):
+                position = futures[future]
+                try:
+                    record = future.result()
+                except (OSError, RuntimeError, ValueError, HTTPException) as e:
+                    problem = str(e) or type(e).__name__
+                    continue
+                # A cancelled job finishes without a record; anything but 'ok' is retried locally
+                if not record or record.get("status") != "ok":
+                    problem = f"job ended as '{record['status'] if record else 'cancelled'}'"
+                    continue
+                remaining.discard(position)
+                yield position, record
+        if remaining:
+            st.warning(f"Analysis service at {ANALYSIS_SERVICE} did not analyze {len(remaining)} file(s) "
+                       f"({problem}); analyzing them locally.")
+    if remaining:
+        from isolated_runner import IsolatedAnalyzer
+        positions = sorted(remaining)
+        with IsolatedAnalyzer(min(ANALYSIS_WORKERS, len(positions)), ANALYSIS_TIMEOUT, ANALYSIS_MAX_RSS_MB,
+                              **options) as analyzer:
+            for local, record in analyzer.imap_unordered([sources[p] for p in positions],
+                                                         [names[p] for p in positions]):
+                yield positions[local], record
+
+def analyze_uploaded_docs(uploaded_files, clause, options, on_complete=None):
+    """
+    Analyze uploaded PDFs concurrently from memory, returning one record per file in upload order.
+    The audit copy of each upload is stored against `clause` in the background. Cache hits are
+    answered by hashing the upload buffer in place; misses run in supervised
+    worker processes (PyMuPDF is not thread-safe), local or in the shared analysis
+    service, that receive the PDF bytes instead of re-reading the saved file and are
+    stopped when a file exceeds ANALYSIS_TIMEOUT or ANALYSIS_MAX_RSS_MB.
+    `options` (see analysis_options) are the detector options, also used for the cache key.
+    on_complete(done, total, name, record) is called on the script thread as each file finishes.
+    """
+    from result_cache import content_sha256, get_default_cache
+    cache = get_default_cache()
+    total = len(uploaded_files)
+    records = [None] * total
+    done = 0
+
+    pending = []  # (index, key, sha256, file_path) of cache misses
+    for index, uploaded_file in enumerate(uploaded_files):
+        sha256 = content_sha256(uploaded_file.getbuffer())
+        file_path = save_uploaded_file_async(uploaded_file, PREPARED_DOCS, clause, sha256)
+        key = cache.key_for(sha256, **options)
+        results = cache.get(key)
+        if results is not None:
+            records[index] = {"file": file_path, "status": "ok", "results": results, "sha256": sha256}
+            done += 1
+            if on_complete:
+                on_complete(done, total, uploaded_file.name, records[index])
+        else:
+            pending.append((index, key, sha256, file_path))
+
+    if pending:
+        sources = [uploaded_files[index].getvalue() for index, _, _, _ in pending]
+        names = [file_path for _, _, _, file_path in pending]
+        for position, record in analyze_pending_docs(sources, names, options):
+            index, key, sha256, _ = pending[position]
+            records[index] = {**record, "sha256": sha256}
+            if record["status"] == "ok":
+                cache.put(key, record["results"])
+            done += 1
+            if on_complete:
+                on_complete(done, total, uploaded_files[index].name, records[index])
+
+    return records
+
+# Initialize session state from the audit database, so a new session resumes the last one
+db = get_default_db()
 if "guideline_path" not in st.session_state:
-    st.session_state["guideline_path"] = None # path to the compliance guideline file
+    latest_guideline = db.latest_guideline()
+    st.session_state["guideline_path"] = latest_guideline["path"] if latest_guideline else None # path to the compliance guideline file
+    st.session_state["guideline_name"] = latest_guideline["name"] if latest_guideline else None
+    st.session_state["guideline_sha256"] = latest_guideline["sha256"] if latest_guideline else None
+    st.session_state["processed_guideline"] = latest_guideline["clauses"] if latest_guideline else [] # clause numbers
 
 if "processed_guideline" not in st.session_state:
     st.session_state["processed_guideline"] = [] # list of processed guideline files
 
 if "docs_per_clause" not in st.session_state:
+    # filled per clause from the database when the clause is first shown
     st.session_state["docs_per_clause"] = {} # {clause: [{"file": path, "results": {...}}, ...]}
 
-# Title
-st.title("AI-Powered PBSA Audit Preparation & Continuous Compliance Maintenance for CRAs")
 
-# Layout single column to upload guideline
-# Create a big custom label
-st.markdown("<h3 style='font-size:24px; font-weight:bold;'>Upload Your Compliance Guideline Files</h3>", unsafe_allow_html=True)
+# Each panel is a fragment: its widgets rerun only that panel, not the whole page
 
-guideline = st.file_uploader("",
-                             type = ["xls", "xlsx", "csv"],
-                             accept_multiple_files=False)
+@st.fragment
+def guideline_panel():
+    # Layout single column to upload guideline
+    # Create a big custom label
+    st.markdown("<h3 style='font-size:24px; font-weight:bold;'>Upload Your Compliance Guideline Files</h3>", unsafe_allow_html=True)
 
-if guideline:
-    # save file once uploaded
-    file_path = save_uploaded_file(guideline, COMPLIANCE_GUIDELINES_DIR)
-    st.session_state["guideline_path"] = file_path
-    st.write(f"uploaded and saved: {guideline.name}")
+    guideline = st.file_uploader("",
+                                 type = ["xls", "xlsx", "csv"],
+                                 accept_multiple_files=False)
 
+    if guideline:
+        # save file once per upload, not on every rerun
+        if st.session_state.get("guideline_file_id") != guideline.file_id:
+            sha256 = hashlib.sha256(guideline.getbuffer()).hexdigest()
+            file_path = save_uploaded_file(guideline, COMPLIANCE_GUIDELINES, sha256=sha256)
+            st.session_state["guideline_path"] = file_path
+            st.session_state["guideline_name"] = guideline.name
+            st.session_state["guideline_sha256"] = sha256
+            st.session_state["guideline_file_id"] = guideline.file_id
+        st.write(f"uploaded and saved: {guideline.name}")
 
-# process guideline button
-if st.session_state.get("guideline_path"):
-    if st.button("Process Compliance Guideline File"):
-        # process and get the section numbers
-        df = read_excel_or_csv(st.session_state["guideline_path"]) # the input is a string path
-        section_numbers = get_section_numbers(df)
-        st.session_state["processed_guideline"] = section_numbers
-        st.success(f"Found {len(section_numbers)} sections in the guideline.")
+    if "guideline_message" in st.session_state:
+        st.success(st.session_state.pop("guideline_message"))
+
+    # process guideline button
+    if st.session_state.get("guideline_path"):
+        if st.button("Process Compliance Guideline File"):
+            # process and get the section numbers
+            guideline = get_guideline(st.session_state["guideline_sha256"], st.session_state["guideline_path"])
+            section_numbers = guideline.section_numbers
+            db.record_guideline(guideline.source_hash,
+                                st.session_state.get("guideline_name") or os.path.basename(st.session_state["guideline_path"]),
+                                st.session_state["guideline_path"], section_numbers, guideline.descriptions)
+            message = f"Found {len(section_numbers)} sections in the guideline."
+            if section_numbers != st.session_state["processed_guideline"]:
+                # the clause dropdown lives outside this fragment, so redraw the page
+                st.session_state["processed_guideline"] = section_numbers
+                st.session_state["guideline_message"] = message
+                st.rerun()
+            st.success(message)
 
-# dropdown menu after guideline is processed
-if st.session_state.get("processed_guideline"):
-    selected_clause = st.selectbox(
-        "Select a clause and upload the related evidence document:",
-        st.session_state["processed_guideline"]
-    )
-    st.write(f"You selected clause: {selected_clause}")
 
+@st.fragment
+def clause_description_panel(selected_clause):
     # show clause description
     if st.button("Show Clause Description"):
-        df = read_excel_or_csv(st.session_state["guideline_path"])
-        clause_text = get_clause_text(df, selected_clause)
+        guideline = get_guideline(st.session_state["guideline_sha256"], st.session_state["guideline_path"])
+        clause_text = guideline.get_clause_text(selected_clause)
         st.write(f"**Clause {selected_clause} Description:** {clause_text}")
 
+
+@st.fragment
+def evidence_panel(selected_clause):
+    if selected_clause not in st.session_state["docs_per_clause"]:
+        st.session_state["docs_per_clause"][selected_clause] = [
+            {"file": row["file"], "results": row["results"]} for row in db.evidence_for_clause(selected_clause)
+        ]
+
     # upload related evidence document
     st.markdown("#### Upload Prepared PDFs for the Selected Clause")
     prepared_docs = st.file_uploader(
@@ -86,21 +249,106 @@ if st.session_state.get("processed_guideline"):
 
     # Only process when user clicks button
     if prepared_docs and st.button("Process PDF Evidence"):
-        for doc in prepared_docs:
-            file_path = save_uploaded_file(doc, PREPARED_DOCS_DIR)
-            results = detect_signatures_multiple_methods(file_path)
+        from result_cache import detector_fingerprint, get_default_cache
 
-            if selected_clause not in st.session_state["docs_per_clause"]:
-                st.session_state["docs_per_clause"][selected_clause] = []
+        options = analysis_options()
+        progress = st.progress(0.0, text=f"Analyzing {len(prepared_docs)} PDF(s)...")
+        with st.status(f"Analyzing {len(prepared_docs)} PDF(s)...", expanded=False) as status:
+            def report_progress(done, total, name, record):
+                progress.progress(done / total, text=f"Analyzed {done}/{total}: {name}")
+                status.write(f"{'✅' if record['status'] == 'ok' else '❌'} {name}")
+
+            records = analyze_uploaded_docs(prepared_docs, selected_clause, options, report_progress)
+            status.update(label=f"Analyzed {len(records)} PDF(s)", state="complete")
+
+        # Results are returned in upload order regardless of completion order
+        fingerprint = detector_fingerprint(**options)
+        for doc, record in zip(prepared_docs, records):
+            results = record.get("results")
+
+            db.record_evidence(record["sha256"], doc.name, record["file"], selected_clause)
+            if record["status"] == "ok":
+                db.record_results(record["sha256"], results, fingerprint)
 
             st.session_state["docs_per_clause"][selected_clause].append({
-                "file": file_path,
+                "file": record["file"],
                 "results": results
             })
 
             st.markdown(f"##### Results for file: {doc.name}")
-            if results and results['has_signatures']:
+            if record["status"] != "ok" and results:
+                st.warning(f"Analysis stopped ({record['error']}); partial results from the structural checks: "
+                           f"{'signatures detected' if results['has_signatures'] else 'no signatures detected'}")
+                st.json(results['details'])
+            elif record["status"] != "ok":
+                st.error(f"Analysis failed: {record['error']}")
+            elif results and results['has_signatures']:
                 st.success(f"Signatures detected! Confidence: {results['confidence']}")
+                verification = results['details'].get('digital_signatures', {}).get('verification')
+                if verification and verification['count']:
+                    message = f"{verification['valid']}/{verification['count']} digital signature(s) verified"
+                    if verification['all_valid']:
+                        st.info(f"🔒 {message}")
+                    elif not verification['invalid'] and verification.get('modified_after_signing'):
+                        st.warning(f"{message}, but the document was changed after the last signature "
+                                   f"(incremental update); check what was added before relying on it")
+                    else:
+                        st.error(f"❌ {message}; {verification['invalid']} failed (document changed or signature broken)")
                 st.json(results['details'])
             else:
                 st.warning("No signatures detected.")
+
+        cache_stats = get_default_cache().stats()
+        st.caption(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                   f"{cache_stats['entries']} stored results")
+
+
+@st.fragment
+def coverage_panel():
+    # bulk status straight from the database, no PDFs re-scanned
+    if st.button("Show Clauses Lacking Signed Evidence"):
+        missing = db.clauses_lacking_signed_evidence()
+        if missing:
+            st.warning(f"{len(missing)} of {len(st.session_state['processed_guideline'])} clauses lack signed evidence:")
+            st.write(", ".join(missing))
+        else:
+            st.success("Every clause has signed evidence.")
+
+    # every clause against every stored evidence file, with a one-click workbook export
+    if st.button("Show Coverage Matrix"):
+        summary, status, matrix, workbook, omitted = get_coverage_report(db.revision())
+        st.write(f"**{summary['clauses']} clauses, {summary['evidence_files']} evidence files:** "
+                 f"{summary['signed']} signed, {summary['unsigned']} unsigned, "
+                 f"{summary['not analyzed']} not analyzed, {summary['no evidence']} without evidence")
+        st.dataframe(status)
+        if matrix.shape[1] <= COVERAGE_MATRIX_DISPLAY_COLUMNS:
+            st.dataframe(matrix)
+        else:
+            st.caption(f"The matrix has {matrix.shape[1]} evidence columns; download the report to see it.")
+        if omitted:
+            st.warning(f"The {', '.join(omitted)} table is too wide for Excel and was omitted from the workbook; "
+                       f"export it with `python coverage_report.py report.csv` (or .parquet).")
+        st.download_button("Download Coverage Report (Excel)", workbook, file_name="coverage_report.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+# Title
+st.title("AI-Powered PBSA Audit Preparation & Continuous Compliance Maintenance for CRAs")
+
+st.sidebar.checkbox("Detect hand-drawn ink signatures", key="visual_ink",
+                    help=f"Also render up to {VISUAL_INK_PAGES} pages per PDF and look for ink strokes. "
+                         "Slower, and it counts towards the confidence of every analyzed file.")
+
+guideline_panel()
+
+# dropdown menu after guideline is processed
+if st.session_state.get("processed_guideline"):
+    selected_clause = st.selectbox(
+        "Select a clause and upload the related evidence document:",
+        st.session_state["processed_guideline"]
+    )
+    st.write(f"You selected clause: {selected_clause}")
+
+    clause_description_panel(selected_clause)
+    evidence_panel(selected_clause)
+    coverage_panel()
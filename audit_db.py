@@ -0,0 +1,326 @@
+"""
+SQLite store for guideline versions, clauses, evidence files and detection results.
+
+This is the durable record of which file was analyzed for which clause and
+what was found, so a new session can pick up where the last one stopped and
+bulk questions ("which clauses lack signed evidence?") are answered with a
+query instead of re-scanning PDFs.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+DEFAULT_DB_PATH = os.path.join("uploads", "audit.db")
+
+# Result lists per detection method, mirroring pdf_processor.METHOD_LIST_KEYS
+_METHOD_LIST_KEYS = {
+    'digital_signatures': ['signatures'],
+    'form_fields': ['fields'],
+    'text_indicators': ['indicators', 'patterns'],
+    'annotations': ['annotations'],
+    'visual_ink': ['regions'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guideline_versions (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clauses (
+    guideline_id INTEGER NOT NULL REFERENCES guideline_versions(id),
+    clause TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    description TEXT,
+    PRIMARY KEY (guideline_id, clause)
+);
+CREATE INDEX IF NOT EXISTS idx_clauses_clause ON clauses(clause);
+
+CREATE TABLE IF NOT EXISTS evidence_files (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    clause TEXT,
+    uploaded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_evidence_clause ON evidence_files(clause);
+CREATE INDEX IF NOT EXISTS idx_evidence_sha256 ON evidence_files(sha256);
+
+CREATE TABLE IF NOT EXISTS detection_results (
+    sha256 TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    has_signatures INTEGER NOT NULL,
+    confidence TEXT NOT NULL,
+    results_json TEXT NOT NULL,
+    analyzed_at TEXT NOT NULL,
+    PRIMARY KEY (sha256, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS idx_results_sha256_time ON detection_results(sha256, analyzed_at);
+CREATE TABLE IF NOT EXISTS method_results (
+    sha256 TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    method TEXT NOT NULL,
+    found INTEGER NOT NULL,
+    match_count INTEGER NOT NULL,
+    PRIMARY KEY (sha256, fingerprint, method)
+);
+CREATE INDEX IF NOT EXISTS idx_method_results_sha256 ON method_results(sha256);
+"""
+
+
+def _json_default(obj: Any) -> Any:
+    # fitz.Rect and friends iterate as numbers; avoids importing PyMuPDF here
+    try:
+        return [float(v) for v in obj]
+    except TypeError:
+        return str(obj)
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class AuditDB:
+    """
+    Thin wrapper over one SQLite file. Each call opens a short-lived
+    connection, so an instance can be shared between Streamlit reruns,
+    threads and processes (WAL mode lets readers run during a write).
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Guidelines
+
+    def record_guideline(self, sha256: str, name: str, path: str, clauses: List[str],
+                         descriptions: Dict[str, Any] = None) -> int:
+        """
+        Store a guideline version and its clauses (idempotent per file hash).
+        Args:
+            sha256 (str): Hash of the guideline file.
+            name (str): Original file name.
+            path (str): Where the file is stored.
+            clauses (List[str]): Normalized clause numbers in file order.
+            descriptions (Dict): Clause number -> description text.
+        Returns:
+            int: The guideline version id.
+        """
+        descriptions = descriptions or {}
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT id FROM guideline_versions WHERE sha256 = ?", (sha256,)).fetchone()
+            if row:
+                conn.execute("UPDATE guideline_versions SET loaded_at = ? WHERE id = ?", (_now(), row['id']))
+                return row['id']
+            guideline_id = conn.execute(
+                "INSERT INTO guideline_versions (sha256, name, path, loaded_at) VALUES (?, ?, ?, ?)",
+                (sha256, name, path, _now())
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO clauses (guideline_id, clause, position, description) VALUES (?, ?, ?, ?)",
+                [(guideline_id, clause, position, None if descriptions.get(clause) is None else str(descriptions[clause]))
+                 for position, clause in enumerate(clauses)]
+            )
+            return guideline_id
+
+    def latest_guideline(self) -> Optional[Dict[str, Any]]:
+        """The most recently loaded guideline version with its clause list, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM guideline_versions ORDER BY loaded_at DESC, id DESC LIMIT 1").fetchone()
+            if not row:
+                return None
+            clauses = [r['clause'] for r in conn.execute(
+                "SELECT clause FROM clauses WHERE guideline_id = ? ORDER BY position", (row['id'],))]
+        return {**dict(row), 'clauses': clauses}
+
+    def clause_description(self, guideline_id: int, clause: str) -> Optional[str]:
+        """Stored description of a clause in a guideline version."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT description FROM clauses WHERE guideline_id = ? AND clause = ?",
+                               (guideline_id, str(clause))).fetchone()
+        return row['description'] if row else None
+
+    # Evidence and results
+
+    def record_evidence(self, sha256: str, name: str, path: str, clause: Any = None) -> int:
+        """Record that a file was uploaded as evidence for a clause; returns its row id."""
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                "INSERT INTO evidence_files (sha256, name, path, clause, uploaded_at) VALUES (?, ?, ?, ?, ?)",
+                (sha256, name, path, None if clause is None else str(clause), _now())
+            ).lastrowid
+
+    def record_results(self, sha256: str, results: Dict[str, Any], fingerprint: str = "") -> None:
+        """Store the combined and per-method detection results for a file's content."""
+        details = results.get('details', {})
+        method_rows = []
+        for method, list_keys in _METHOD_LIST_KEYS.items():
+            method_result = details.get(method, {})
+            method_rows.append((sha256, fingerprint, method, int(bool(method_result.get('found'))),
+                                method_result.get('count', sum(len(method_result.get(k, [])) for k in list_keys))))
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO detection_results "
+                "(sha256, fingerprint, has_signatures, confidence, results_json, analyzed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, fingerprint, int(results['has_signatures']), results['confidence'],
+                 json.dumps(results, default=_json_default), _now())
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO method_results (sha256, fingerprint, method, found, match_count) "
+                "VALUES (?, ?, ?, ?, ?)", method_rows
+            )
+
+    def get_results(self, sha256: str, fingerprint: str = None) -> Optional[Dict[str, Any]]:
+        """Stored results for a file's content; the latest analysis if no fingerprint is given."""
+        with self._connect() as conn:
+            if fingerprint is None:
+                row = conn.execute("SELECT results_json FROM detection_results WHERE sha256 = ? "
+                                   "ORDER BY analyzed_at DESC LIMIT 1", (sha256,)).fetchone()
+            else:
+                row = conn.execute("SELECT results_json FROM detection_results WHERE sha256 = ? AND fingerprint = ?",
+                                   (sha256, fingerprint)).fetchone()
+        return json.loads(row['results_json']) if row else None
+
+    def _latest_results_sql(self) -> str:
+        # Latest analysis per content hash
+        return ("SELECT r.* FROM detection_results r WHERE r.analyzed_at = "
+                "(SELECT MAX(analyzed_at) FROM detection_results WHERE sha256 = r.sha256)")
+
+    def evidence_for_clause(self, clause: Any) -> List[Dict[str, Any]]:
+        """Evidence files for a clause with their latest results, in upload order."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT e.path, e.name, e.sha256, r.results_json FROM evidence_files e "
+                f"LEFT JOIN ({self._latest_results_sql()}) r ON r.sha256 = e.sha256 "
+                f"WHERE e.clause = ? ORDER BY e.id", (str(clause),)
+            ).fetchall()
+        return [{'file': row['path'], 'name': row['name'], 'sha256': row['sha256'],
+                 'results': json.loads(row['results_json']) if row['results_json'] else None} for row in rows]
+
+    def clause_for_evidence(self, sha256: str) -> Optional[str]:
+        """Clause a file's content was most recently uploaded as evidence for, if any."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT clause FROM evidence_files WHERE sha256 = ? AND clause IS NOT NULL "
+                               "ORDER BY id DESC LIMIT 1", (sha256,)).fetchone()
+        return row['clause'] if row else None
+
+    def docs_per_clause(self) -> Dict[str, List[Dict[str, Any]]]:
+        """All evidence grouped by clause, shaped like the app's session_state['docs_per_clause']."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT e.clause, e.path, r.results_json FROM evidence_files e "
+                f"LEFT JOIN ({self._latest_results_sql()}) r ON r.sha256 = e.sha256 "
+                f"WHERE e.clause IS NOT NULL ORDER BY e.id"
+            ).fetchall()
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row['clause'], []).append({
+                'file': row['path'],
+                'results': json.loads(row['results_json']) if row['results_json'] else None,
+            })
+        return grouped
+
+    def clauses_lacking_signed_evidence(self, guideline_id: int = None) -> List[str]:
+        """
+        Clauses of a guideline version (default: the latest) with no evidence
+        file whose latest analysis found signatures.
+        """
+        if guideline_id is None:
+            latest = self.latest_guideline()
+            if not latest:
+                return []
+            guideline_id = latest['id']
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT c.clause FROM clauses c WHERE c.guideline_id = ? AND NOT EXISTS ("
+                f"  SELECT 1 FROM evidence_files e JOIN ({self._latest_results_sql()}) r ON r.sha256 = e.sha256 "
+                f"  WHERE e.clause = c.clause AND r.has_signatures = 1"
+                f") ORDER BY c.position", (guideline_id,)
+            ).fetchall()
+        return [row['clause'] for row in rows]
+
+    # Bulk reads for reporting (see coverage_report)
+
+    def revision(self) -> str:
+        """Token that changes whenever a guideline, evidence file or analysis is recorded; for cache keys."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT (SELECT MAX(id) FROM guideline_versions), (SELECT MAX(loaded_at) FROM guideline_versions), "
+                "(SELECT MAX(id) FROM evidence_files), (SELECT MAX(rowid) FROM detection_results)"
+            ).fetchone()
+        return ":".join("" if value is None else str(value) for value in row)
+
+    def guideline_versions(self) -> List[Dict[str, Any]]:
+        """All stored guideline versions, oldest first, with their clause counts."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT g.id, g.name, g.sha256, g.path, g.loaded_at, COUNT(c.clause) AS clause_count "
+                "FROM guideline_versions g LEFT JOIN clauses c ON c.guideline_id = g.id "
+                "GROUP BY g.id ORDER BY g.loaded_at, g.id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def clause_rows(self, guideline_id: int) -> List[Dict[str, Any]]:
+        """Clauses of a guideline version in file order."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT clause, position, description FROM clauses WHERE guideline_id = ? "
+                                "ORDER BY position", (guideline_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def evidence_result_rows(self) -> List[Dict[str, Any]]:
+        """
+        One row per distinct (clause, file content) with the latest upload's name
+        and path and the latest analysis; result columns are None if never analyzed.
+        """
+        with self._connect() as conn:
+            # SQLite takes the bare columns from the row holding MAX(e.id), i.e. the latest upload
+            rows = conn.execute(
+                f"SELECT e.clause, e.sha256, e.name, e.path, e.uploaded_at, MAX(e.id) AS evidence_id, "
+                f"r.has_signatures, r.confidence, r.fingerprint, r.analyzed_at FROM evidence_files e "
+                f"LEFT JOIN ({self._latest_results_sql()}) r ON r.sha256 = e.sha256 "
+                f"WHERE e.clause IS NOT NULL GROUP BY e.clause, e.sha256 ORDER BY evidence_id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def method_result_rows(self) -> List[Dict[str, Any]]:
+        """Per-method findings (sha256, method, found, match_count) of each file's latest analysis."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT m.sha256, m.method, m.found, m.match_count FROM method_results m "
+                f"JOIN ({self._latest_results_sql()}) r ON r.sha256 = m.sha256 AND r.fingerprint = m.fingerprint"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_default_db = None
+
+
+def get_default_db() -> AuditDB:
+    """Process-wide database at uploads/audit.db."""
+    global _default_db
+    if _default_db is None:
+        _default_db = AuditDB()
+    return _default_db
@@ -0,0 +1,254 @@
+"""
+Headless batch signature analysis.
+
+Scans a folder (or glob, or list of files) of PDFs on a process pool and
+streams one JSON line per file to the output as results complete:
+
+    python batch_cli.py pdf_folder/ -o results.jsonl
+    python batch_cli.py "evidence/**/*.pdf" -o results.jsonl --resume
+    python batch_cli.py pdf_folder/ --verdict medium      # fast yes/no triage
+    python batch_cli.py pdf_folder/ --verify              # also check signatures cryptographically
+    python batch_cli.py scans/ --ink 10                   # look for wet-ink signatures on up to 10 pages
+    python batch_cli.py vendor/ --isolate --timeout 60    # contain files that hang or blow up
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from typing import Dict, List, Any, Iterable, Set
+
+from pdf_processor import (
+    CONFIDENCE_THRESHOLDS, DEFAULT_TEXT_BACKEND, TEXT_BACKENDS, MetricsAggregator, PdfSource,
+    detect_signatures_multiple_methods, results_json_default
+)
+
+
+def collect_pdf_paths(inputs: Iterable[str], recursive: bool = False) -> List[str]:
+    """
+    Expand directories, glob patterns and plain file paths into a sorted list of PDFs.
+    Args:
+        inputs (Iterable[str]): Directories, globs or files.
+        recursive (bool): Descend into subdirectories of directory inputs.
+    Returns:
+        List[str]: Unique PDF paths.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*.pdf") if recursive else os.path.join(item, "*.pdf")
+            matches = glob.glob(pattern, recursive=recursive)
+            matches += glob.glob(pattern[:-3] + "PDF", recursive=recursive)
+        elif os.path.isfile(item):
+            matches = [item]
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.update(os.path.abspath(m) for m in matches if m.lower().endswith(".pdf") and os.path.isfile(m))
+    return sorted(paths)
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """
+    Read an existing output file and return the files it already covers.
+    A truncated last line (from an interrupted run) is cut off so new
+    records append cleanly.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") == "ok":
+            completed.add(record["file"])
+    return completed
+
+
+def analyze_file(file_path: PdfSource, text_backend: str = DEFAULT_TEXT_BACKEND, use_cache: bool = False,
+                 mode: str = 'full', target_confidence: str = 'medium', include_timings: bool = False,
+                 name: str = None, verify_signatures: bool = False, visual_ink_pages: int = 0) -> Dict[str, Any]:
+    """
+    Worker entry point: analyze one PDF and wrap the outcome in a batch record.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        text_backend (str): Text extraction backend.
+        use_cache (bool): Read and fill the shared result cache.
+        mode (str): 'full', 'verdict' or 'streaming', see detect_signatures_multiple_methods.
+        target_confidence (str): Confidence at which verdict mode stops.
+        include_timings (bool): Attach per-method timings to the results.
+        name (str): Value for the record's 'file' field, defaults to file_path.
+        verify_signatures (bool): Cryptographically verify digital signatures (full mode only).
+        visual_ink_pages (int): Page budget for the visual ink method (full mode only); 0 leaves it off.
+    Returns:
+        Dict: {'file', 'status', 'seconds', 'results'} or {'file', 'status', 'error'}.
+    """
+    start = time.perf_counter()
+    name = name or file_path
+    try:
+        if use_cache:
+            from result_cache import get_default_cache
+            results = get_default_cache().analyze(file_path, text_backend, mode, target_confidence, include_timings,
+                                                  verify_signatures, visual_ink_pages)
+        else:
+            results = detect_signatures_multiple_methods(file_path, text_backend, mode, target_confidence,
+                                                         include_timings, verify_signatures, visual_ink_pages)
+        return {'file': name, 'status': 'ok', 'seconds': round(time.perf_counter() - start, 3), 'results': results}
+    except Exception as e:
+        return {'file': name, 'status': 'error', 'seconds': round(time.perf_counter() - start, 3), 'error': str(e)}
+
+
+def run_batch(paths: List[str], output, workers: int = None, text_backend: str = DEFAULT_TEXT_BACKEND,
+              use_cache: bool = False, mode: str = 'full', target_confidence: str = 'medium',
+              stats: MetricsAggregator = None, verify_signatures: bool = False,
+              visual_ink_pages: int = 0, isolation: Dict[str, Any] = None) -> Dict[str, int]:
+    """
+    Fan analysis out over a process pool and write each record as soon as it completes.
+    Args:
+        paths (List[str]): PDFs to analyze.
+        output: Text file object receiving JSON lines.
+        workers (int): Pool size, defaults to the number of cores.
+        text_backend (str): Text extraction backend.
+        use_cache (bool): Use the shared result cache.
+        mode (str): 'full', 'verdict' or 'streaming'.
+        target_confidence (str): Confidence at which verdict mode stops.
+        stats (MetricsAggregator): If given, workers report timings and they are totalled here.
+        verify_signatures (bool): Cryptographically verify digital signatures.
+        visual_ink_pages (int): Page budget for the visual ink method; 0 leaves it off.
+        isolation (Dict): IsolatedAnalyzer limits (timeout, max_rss_mb, max_docs_per_worker);
+                          when given, each file runs in a supervised worker (full mode only).
+    Returns:
+        Dict: Counts of processed, signed and failed files, and of files with an invalid signature
+              or content added after the last signature.
+    """
+    summary = {'processed': 0, 'signed': 0, 'errors': 0, 'invalid_signatures': 0}
+    if not paths:
+        return summary
+
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    with ExitStack() as stack:
+        if isolation is not None:
+            from isolated_runner import IsolatedAnalyzer
+            analyzer = stack.enter_context(IsolatedAnalyzer(
+                workers, text_backend=text_backend, use_cache=use_cache, include_timings=stats is not None,
+                verify_signatures=verify_signatures, visual_ink_pages=visual_ink_pages, **isolation))
+            records = (record for _, record in analyzer.imap_unordered(paths))
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            futures = [pool.submit(analyze_file, path, text_backend, use_cache, mode, target_confidence,
+                                   stats is not None, verify_signatures=verify_signatures,
+                                   visual_ink_pages=visual_ink_pages)
+                       for path in paths]
+            records = (future.result() for future in as_completed(futures))
+
+        for record in records:
+            output.write(json.dumps(record, default=results_json_default) + "\n")
+            output.flush()
+
+            summary['processed'] += 1
+            if record['status'] != 'ok':
+                summary['errors'] += 1
+            else:
+                if record['results']['has_signatures']:
+                    summary['signed'] += 1
+                verification = record['results']['details'].get('digital_signatures', {}).get('verification')
+                if verification and verification['count'] and not verification['all_valid']:
+                    summary['invalid_signatures'] += 1
+                if stats is not None:
+                    for metric in record['results'].get('timings', {}).values():
+                        stats(metric)
+            print(f"[{summary['processed']}/{len(paths)}] {record['status']}: {os.path.basename(record['file'])}",
+                  file=sys.stderr)
+    return summary
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch PDF signature analysis")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("-o", "--output", help="JSON lines output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="descend into subdirectories")
+    parser.add_argument("--resume", action="store_true", help="skip files already recorded in --output")
+    parser.add_argument("--text-backend", choices=sorted(TEXT_BACKENDS), default=DEFAULT_TEXT_BACKEND)
+    parser.add_argument("--cache", action="store_true", help="read and fill the shared result cache")
+    parser.add_argument("--verdict", choices=sorted(CONFIDENCE_THRESHOLDS), metavar="CONFIDENCE",
+                        help="fast yes/no mode: stop each file once this confidence (medium/high) is reached")
+    parser.add_argument("--streaming", action="store_true",
+                        help="page-streaming mode with bounded memory for very large PDFs")
+    parser.add_argument("--verify", action="store_true",
+                        help="cryptographically verify digital signatures (ByteRange digest and CMS signature)")
+    parser.add_argument("--ink", type=int, default=0, metavar="PAGES",
+                        help="look for wet-ink/image signatures in rendered regions on up to PAGES pages per file")
+    parser.add_argument("--isolate", action="store_true",
+                        help="run each file in a supervised worker that is killed on timeout or memory overrun")
+    parser.add_argument("--timeout", type=float, default=None, metavar="SECONDS",
+                        help="with --isolate: wall-clock limit per file (default: 120)")
+    parser.add_argument("--max-rss", type=float, default=None, metavar="MB",
+                        help="with --isolate: resident memory limit per worker (default: 2048)")
+    parser.add_argument("--recycle", type=int, default=None, metavar="N",
+                        help="with --isolate: replace each worker after N files (default: 50)")
+    parser.add_argument("--stats", nargs="?", const="-", metavar="FILE",
+                        help="collect per-method timings and write the aggregate report to FILE (default: stderr)")
+    parser.add_argument("--log-level", default="WARNING", help="logging level for pdf_processor (e.g. DEBUG)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+    if args.verdict and args.streaming:
+        parser.error("--verdict and --streaming are mutually exclusive")
+    if (args.verify or args.ink or args.isolate) and (args.verdict or args.streaming):
+        parser.error("--verify, --ink and --isolate need the full mode")
+    if not args.isolate and any(value is not None for value in (args.timeout, args.max_rss, args.recycle)):
+        parser.error("--timeout, --max-rss and --recycle need --isolate")
+
+    paths = collect_pdf_paths(args.inputs, args.recursive)
+    if args.resume:
+        completed = load_completed(args.output)
+        paths = [path for path in paths if path not in completed]
+        print(f"Resuming: {len(completed)} already done, {len(paths)} to go", file=sys.stderr)
+
+    mode = 'verdict' if args.verdict else 'streaming' if args.streaming else 'full'
+    stats = MetricsAggregator() if args.stats else None
+    isolation = None
+    if args.isolate:
+        limits = {'timeout': args.timeout, 'max_rss_mb': args.max_rss, 'max_docs_per_worker': args.recycle}
+        isolation = {name: value for name, value in limits.items() if value is not None}
+    options = (args.workers, args.text_backend, args.cache, mode, args.verdict or 'medium', stats,
+               args.verify, args.ink, isolation)
+    if args.output:
+        with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+            summary = run_batch(paths, output, *options)
+    else:
+        summary = run_batch(paths, sys.stdout, *options)
+
+    if stats is not None:
+        report = json.dumps(stats.report(), indent=2)
+        if args.stats == "-":
+            print(report, file=sys.stderr)
+        else:
+            with open(args.stats, "w", encoding="utf-8") as f:
+                f.write(report + "\n")
+
+    print(f"✅ {summary['processed']} files, {summary['signed']} with signatures, {summary['errors']} errors",
+          file=sys.stderr)
+    if args.verify:
+        print(f"🔒 {summary['invalid_signatures']} files with a signature that failed verification "
+              f"or content added after the last signature", file=sys.stderr)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
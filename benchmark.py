@@ -0,0 +1,321 @@
+"""
+Benchmarks for pdf_processor on a synthetic, reproducible PDF corpus.
+
+The corpus is generated offline with PyMuPDF from fixed seeds, varying page
+count, text density, signature widgets, form fields, Stamp/FreeText
+annotations and signature phrases. Each detector and the combined call are
+timed on every document, with peak Python heap (tracemalloc) and peak RSS
+(measured in a fresh process per call, so memory held by the PDF libraries'
+C code counts too), and results are written as JSON so two runs can be
+diffed:
+
+    python benchmark.py -o bench_before.json
+    python benchmark.py -o bench_after.json --compare bench_before.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import fitz  # PyMuPDF
+
+import pdf_processor
+
+# Filler vocabulary for body text; deliberately free of signature keywords
+_WORDS = (
+    "policy procedure control access review annual vendor security audit evidence "
+    "management risk assessment report customer data retention training incident "
+    "response record background screening compliance program requirement section "
+    "employee process quarterly monitoring verification documentation approved"
+).split()
+
+SIGNATURE_PHRASES = [
+    "Digitally signed by Jordan Smith",
+    "This document was signed electronically",
+    "Signature date: 03/14/2024",
+    "Signed on 4/2/2024 by the compliance officer",
+    "DocuSign Envelope ID: 1A2B3C4D-0000-1111-2222-333344445555",
+    "/s/ Casey Morgan",
+    "Signatory: Chief Compliance Officer",
+    "Signed with Adobe Sign on June 3, 2024",
+]
+
+# name: (pages, words per page, signature widgets, form fields, annotations, signature phrases)
+CORPUS_SPECS = {
+    'small_plain':      (2, 150, 0, 0, 0, 0),
+    'small_signed':     (3, 150, 1, 2, 1, 3),
+    'medium_text':      (40, 400, 0, 0, 0, 10),
+    'medium_forms':     (40, 200, 4, 30, 5, 5),
+    'dense_text':       (60, 1200, 0, 0, 0, 40),
+    'annotation_heavy': (30, 200, 0, 0, 60, 2),
+    'large_mixed':      (300, 400, 3, 20, 10, 30),
+}
+
+# Subset used by --quick
+QUICK_SPECS = ['small_plain', 'small_signed', 'medium_forms']
+
+# Detector entry points timed for each document
+BENCHMARKS: Dict[str, Callable[[str], Any]] = {
+    'detect_digital_signatures': pdf_processor.detect_digital_signatures,
+    'detect_signature_form_fields': pdf_processor.detect_signature_form_fields,
+    'detect_signature_text_indicators': pdf_processor.detect_signature_text_indicators,
+    'detect_signature_annotations': pdf_processor.detect_signature_annotations,
+    'detect_signatures_multiple_methods': pdf_processor.detect_signatures_multiple_methods,
+}
+
+
+def generate_pdf(path: str, pages: int, words_per_page: int, signature_widgets: int = 0,
+                 form_fields: int = 0, annotations: int = 0, signature_phrases: int = 0, seed: int = 0) -> str:
+    """
+    Write a synthetic PDF. The same arguments always produce the same bytes.
+    Args:
+        path (str): Output path.
+        pages (int): Page count.
+        words_per_page (int): Filler words per page (text density).
+        signature_widgets (int): Signature-type widgets, spread over the pages.
+        form_fields (int): Text form fields; every other one has a signature-like name.
+        annotations (int): Stamp/FreeText annotations, alternating, mentioning signatures.
+        signature_phrases (int): Signature phrases inserted into the body text.
+        seed (int): Random seed.
+    Returns:
+        str: The output path.
+    """
+    rng = random.Random(seed)
+    phrase_pages = [rng.randrange(pages) for _ in range(signature_phrases)]
+    doc = fitz.open()
+
+    for page_num in range(pages):
+        page = doc.new_page()
+        words = [rng.choice(_WORDS) for _ in range(words_per_page)]
+        for _ in range(phrase_pages.count(page_num)):
+            words.insert(rng.randrange(len(words) + 1), SIGNATURE_PHRASES[rng.randrange(len(SIGNATURE_PHRASES))] + ".")
+        page.insert_textbox(fitz.Rect(36, 36, 559, 700), " ".join(words), fontsize=7)
+
+    def place(index: int, total: int, row: int):
+        page = doc[index * pages // max(total, 1)]
+        y = 710 + (row % 4) * 30
+        return page, fitz.Rect(36 + (index % 3) * 170, y, 190 + (index % 3) * 170, y + 24)
+
+    for i in range(signature_widgets):
+        page, rect = place(i, signature_widgets, 0)
+        widget = fitz.Widget()
+        widget.field_type = fitz.PDF_WIDGET_TYPE_SIGNATURE
+        widget.field_name = f"Signature{i + 1}"
+        widget.rect = rect
+        page.add_widget(widget)
+
+    for i in range(form_fields):
+        page, rect = place(i, form_fields, 1 + i // 3)
+        widget = fitz.Widget()
+        widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+        widget.field_name = f"signer_name_{i}" if i % 2 == 0 else f"department_{i}"
+        widget.field_value = rng.choice(_WORDS)
+        widget.rect = rect
+        page.add_widget(widget)
+
+    for i in range(annotations):
+        page, rect = place(i, annotations, 2 + i // 3)
+        if i % 2 == 0:
+            annot = page.add_stamp_annot(rect, stamp=fitz.STAMP_Approved)
+            annot.set_info(content="Approved and signed", title="Reviewer")
+        else:
+            annot = page.add_freetext_annot(rect, "Electronic signature applied", fontsize=6)
+        annot.update()
+
+    doc.set_metadata({'producer': 'pbsa benchmark', 'creator': 'pbsa benchmark'})
+    doc.save(path, garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return path
+
+
+def build_corpus(corpus_dir: str, names: List[str] = None) -> Dict[str, str]:
+    """Generate (or reuse) the corpus documents; returns {name: path}."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {}
+    for seed, name in enumerate(sorted(CORPUS_SPECS)):
+        if names and name not in names:
+            continue
+        path = os.path.join(corpus_dir, f"{name}.pdf")
+        if not os.path.exists(path):
+            generate_pdf(path, *CORPUS_SPECS[name], seed=seed)
+        corpus[name] = path
+    return corpus
+
+
+def _peak_rss() -> int:
+    """
+    Peak resident set size of this process in bytes: VmHWM where /proc has it,
+    else ru_maxrss (KiB on Linux, bytes on macOS). On Linux ru_maxrss also
+    carries the high-water mark of the process this one was forked from.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_peak_rss() -> None:
+    """Lower the peak RSS to the current RSS (Linux), so transient import-time memory does not hide the call's."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _rss_of_call(bench_name: str, path: str) -> Dict[str, int]:
+    """Run one benchmark call and report the process's peak RSS before and after it."""
+    func = BENCHMARKS[bench_name]
+    _reset_peak_rss()
+    before = _peak_rss()
+    func(path)
+    return {'peak_rss_bytes': _peak_rss(), 'rss_increase_bytes': _peak_rss() - before}
+
+
+def measure_rss(bench_name: str, path: str) -> Optional[Dict[str, int]]:
+    """
+    Peak RSS of one benchmark call, measured in a freshly spawned process.
+    tracemalloc only sees the Python heap; the PDF libraries allocate most of
+    their memory in C, which only the resident set shows. A new process per
+    call keeps earlier benchmarks' high-water marks out of the number.
+    Args:
+        bench_name (str): Key of BENCHMARKS.
+        path (str): Corpus document.
+    Returns:
+        Dict: 'peak_rss_bytes' for the whole process and 'rss_increase_bytes' over its
+              state once imports were done, or None where getrusage is unavailable.
+    """
+    if resource is None:
+        return None
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_rss_of_call, bench_name, path).result()
+
+
+def time_call(func: Callable[[str], Any], path: str, repeats: int) -> Dict[str, float]:
+    """Best-of-`repeats` wall time plus peak Python heap from one traced call."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(path)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'best_seconds': min(times), 'mean_seconds': sum(times) / len(times), 'peak_python_bytes': peak}
+
+
+def run_benchmarks(corpus: Dict[str, str], repeats: int = 3) -> Dict[str, Any]:
+    """
+    Time every benchmark on every corpus document.
+    Returns:
+        Dict: {'environment': {...}, 'results': {document: {benchmark: stats}}}
+    """
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'repeats': repeats,
+        },
+        'results': {},
+    }
+
+    for name, path in corpus.items():
+        with fitz.open(path) as doc:
+            pages = len(doc)
+        document = {'pages': pages, 'bytes': os.path.getsize(path), 'benchmarks': {}}
+        for bench_name, func in BENCHMARKS.items():
+            stats = time_call(func, path, repeats)
+            stats.update(measure_rss(bench_name, path) or {'peak_rss_bytes': None, 'rss_increase_bytes': None})
+            stats['pages_per_sec'] = round(pages / stats['best_seconds'], 1) if stats['best_seconds'] else None
+            stats['best_seconds'] = round(stats['best_seconds'], 5)
+            stats['mean_seconds'] = round(stats['mean_seconds'], 5)
+            document['benchmarks'][bench_name] = stats
+            print(f"{name:18} {bench_name:36} {stats['best_seconds']:9.4f}s {stats['pages_per_sec'] or 0:10.1f} pages/s "
+                  f"{stats['peak_python_bytes'] / 1024:9.1f} KiB heap "
+                  f"{(stats['rss_increase_bytes'] or 0) / 2**20:7.1f} MiB RSS", file=sys.stderr)
+        report['results'][name] = document
+
+    return report
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    Compare best times of two reports.
+    Returns:
+        List[Dict]: One entry per shared (document, benchmark) with the time ratio;
+                    'regression' is set when current is more than `threshold` slower.
+    """
+    rows = []
+    for name, document in current['results'].items():
+        old_document = baseline.get('results', {}).get(name)
+        if not old_document:
+            continue
+        for bench_name, stats in document['benchmarks'].items():
+            old_stats = old_document['benchmarks'].get(bench_name)
+            if not old_stats or not old_stats['best_seconds']:
+                continue
+            ratio = stats['best_seconds'] / old_stats['best_seconds']
+            rows.append({
+                'document': name, 'benchmark': bench_name,
+                'baseline_seconds': old_stats['best_seconds'], 'current_seconds': stats['best_seconds'],
+                'ratio': round(ratio, 3), 'regression': ratio > 1 + threshold,
+            })
+    return rows
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pdf_processor on a synthetic PDF corpus")
+    parser.add_argument("--corpus-dir", default=os.path.join("pdf_folder", "benchmark_corpus"))
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON report path")
+    parser.add_argument("-n", "--repeats", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help=f"only run {', '.join(QUICK_SPECS)}")
+    parser.add_argument("--only", nargs="+", choices=sorted(CORPUS_SPECS), help="corpus documents to run")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier JSON report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown ratio flagged as a regression")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.corpus_dir, args.only or (QUICK_SPECS if args.quick else None))
+    report = run_benchmarks(corpus, args.repeats)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report['comparison'] = compare_reports(json.load(f), report, args.threshold)
+        for row in report['comparison']:
+            flag = "⚠️ " if row['regression'] else "  "
+            print(f"{flag}{row['document']:18} {row['benchmark']:36} x{row['ratio']:.2f}", file=sys.stderr)
+        if any(row['regression'] for row in report['comparison']):
+            exit_code = 1
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Benchmark report written to {args.output}", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Clause coverage across the whole guideline.
+
+Joins a guideline version's clauses against every stored evidence file and
+its latest detection results (audit_db) in a few vectorized pandas steps,
+instead of looking clauses up one at a time:
+
+    report = build_coverage_report()          # latest guideline
+    report.status                             # one row per clause: evidence counts, status, best confidence
+    report.matrix                             # clause x evidence file
+    report.export("coverage.xlsx")            # or .csv / .parquet, one file per table
+
+    python coverage_report.py coverage.xlsx --diff-from 3
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from typing import Dict, List, Any
+
+import numpy as np
+import pandas as pd
+
+from audit_db import AuditDB, get_default_db
+
+CONFIDENCE_LEVELS = ['low', 'medium', 'high']
+# Clause status, best first
+STATUSES = ['signed', 'unsigned', 'not analyzed', 'no evidence']
+EXPORT_FORMATS = {'.xlsx': 'excel', '.csv': 'csv', '.parquet': 'parquet'}
+# Excel's column limit, less the clause index column
+_EXCEL_MAX_COLUMNS = 16383
+
+_EVIDENCE_COLUMNS = ['clause', 'sha256', 'name', 'path', 'uploaded_at', 'evidence_id', 'has_signatures', 'confidence',
+                     'fingerprint', 'analyzed_at']
+_METHOD_COLUMNS = ['sha256', 'method', 'found', 'match_count']
+
+
+def load_clauses(db: AuditDB, guideline_id: int) -> pd.DataFrame:
+    """Clauses of a guideline version (clause, position, description) in file order."""
+    return pd.DataFrame(db.clause_rows(guideline_id), columns=['clause', 'position', 'description'])
+
+
+def load_evidence(db: AuditDB) -> pd.DataFrame:
+    """
+    Every (clause, evidence file) pair with its latest results and one
+    found_<method> column per detection method.
+    """
+    evidence = pd.DataFrame(db.evidence_result_rows(), columns=_EVIDENCE_COLUMNS)
+    methods = pd.DataFrame(db.method_result_rows(), columns=_METHOD_COLUMNS)
+    if not methods.empty:
+        flags = methods.pivot_table(index='sha256', columns='method', values='found', aggfunc='max') > 0
+        evidence = evidence.merge(flags.add_prefix('found_'), left_on='sha256', right_index=True, how='left')
+    evidence['analyzed'] = evidence['has_signatures'].notna()
+    evidence['signed'] = evidence['has_signatures'].eq(1)
+    evidence['confidence'] = pd.Categorical(evidence['confidence'], categories=CONFIDENCE_LEVELS, ordered=True)
+    return evidence.drop(columns=['has_signatures', 'evidence_id'])
+
+
+def coverage_pairs(clauses: pd.DataFrame, evidence: pd.DataFrame) -> pd.DataFrame:
+    """Clauses left-joined with their evidence; clauses without evidence keep one row with blanks."""
+    pairs = clauses.merge(evidence, on='clause', how='left', sort=False)
+    has_evidence = pairs['sha256'].notna()
+    pairs['analyzed'] = pairs['analyzed'].astype('boolean').fillna(False).astype(bool)
+    pairs['signed'] = pairs['signed'].astype('boolean').fillna(False).astype(bool)
+    pairs['cell'] = np.select([pairs['signed'], pairs['analyzed'], has_evidence],
+                              ['signed (' + pairs['confidence'].astype(str) + ')', 'unsigned', 'not analyzed'], '')
+    return pairs
+
+
+def clause_status(pairs: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per clause in guideline order.
+    Columns: description, evidence, analyzed and signed (file counts),
+    best_confidence (of the signed files) and status (one of STATUSES).
+    """
+    grouped = pairs.assign(
+        has_evidence=pairs['sha256'].notna(),
+        signed_confidence=pairs['confidence'].where(pairs['signed']),
+    ).groupby(['position', 'clause'], sort=True, observed=True)
+    status = grouped.agg(description=('description', 'first'), evidence=('has_evidence', 'sum'),
+                         analyzed=('analyzed', 'sum'), signed=('signed', 'sum'),
+                         best_confidence=('signed_confidence', 'max'))
+    status = status.reset_index(level='position', drop=True)
+    status['status'] = pd.Categorical(
+        np.select([status['signed'] > 0, status['analyzed'] > 0, status['evidence'] > 0], STATUSES[:3], STATUSES[3]),
+        categories=STATUSES, ordered=True)
+    return status
+
+
+def coverage_matrix(pairs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clause x evidence file table. Cells are 'signed (<confidence>)', 'unsigned',
+    'not analyzed', or blank where the file is not evidence for the clause.
+    Files are labelled by name, with a short hash where different contents share a name.
+    """
+    clauses = pd.Index(pairs['clause'].drop_duplicates(), name='clause')
+    linked = pairs[pairs['sha256'].notna()]
+    shared_name = linked.groupby('name')['sha256'].transform('nunique') > 1
+    labels = linked['name'].where(~shared_name, linked['name'] + ' [' + linked['sha256'].str[:8] + ']')
+    files = pd.Index(labels.unique(), name='evidence')
+    # Filling one preallocated block by position is much faster than pivoting thousands of string columns
+    cells = np.full((len(clauses), len(files)), '', dtype=object)
+    cells[clauses.get_indexer(linked['clause']), files.get_indexer(labels)] = linked['cell'].to_numpy()
+    return pd.DataFrame(cells, index=clauses, columns=files)
+
+
+def _write_wide_csv(table: pd.DataFrame, path: str) -> None:
+    """Write a wide string table; the csv module is several times faster than to_csv per cell."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([table.index.name, *table.columns])
+        writer.writerows(np.column_stack([table.index.to_numpy(), table.to_numpy()]).tolist())
+
+
+def _write_wide_parquet(table: pd.DataFrame, path: str) -> None:
+    """Write a wide table of a few distinct strings as dictionary-encoded columns sharing one dictionary."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    values = pd.Categorical(table.to_numpy().ravel())
+    codes = values.codes.reshape(table.shape)
+    dictionary = pa.array(values.categories.astype(str))
+    columns = [pa.DictionaryArray.from_arrays(codes[:, j], dictionary) for j in range(table.shape[1])]
+    pq.write_table(pa.Table.from_arrays([pa.array(table.index), *columns], names=[table.index.name, *table.columns]),
+                   path)
+
+
+class CoverageReport:
+    """Coverage of one guideline version, computed once and exported in any format."""
+
+    def __init__(self, guideline: Dict[str, Any], clauses: pd.DataFrame, evidence: pd.DataFrame,
+                 diff: pd.DataFrame = None):
+        self.guideline = guideline
+        self.pairs = coverage_pairs(clauses, evidence)
+        self.status = clause_status(self.pairs)
+        self.matrix = coverage_matrix(self.pairs)
+        self.diff = diff
+
+    @property
+    def summary(self) -> Dict[str, Any]:
+        counts = self.status['status'].value_counts()
+        return {'guideline': self.guideline['name'], 'guideline_id': self.guideline['id'],
+                'clauses': len(self.status), 'evidence_files': int(self.pairs['sha256'].nunique()),
+                **{status: int(counts.get(status, 0)) for status in STATUSES}}
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        """Tables written by export, by name."""
+        tables = {'status': self.status, 'matrix': self.matrix,
+                  'pairs': self.pairs.drop(columns=['cell']).set_index('clause')}
+        if self.diff is not None:
+            tables['diff'] = self.diff
+        return tables
+
+    @property
+    def excel_omitted(self) -> List[str]:
+        """Tables too wide for an Excel sheet, which write_excel leaves out."""
+        return [name for name, table in self.tables().items() if table.shape[1] > _EXCEL_MAX_COLUMNS]
+
+    def export(self, path: str, fmt: str = None) -> List[str]:
+        """
+        Write every table in one pass.
+        Args:
+            path (str): Output file; its extension picks the format unless fmt is given.
+            fmt (str): 'excel' (one sheet per table), 'csv' or 'parquet' (one file per table,
+                       named <stem>_<table><ext>).
+        Returns:
+            List[str]: Paths written.
+        """
+        stem, ext = os.path.splitext(path)
+        fmt = fmt or EXPORT_FORMATS.get(ext.lower())
+        if fmt not in EXPORT_FORMATS.values():
+            raise ValueError(f"Unknown export format for '{path}', use one of {', '.join(EXPORT_FORMATS)}")
+        if fmt == 'excel':
+            self.write_excel(path)
+            return [path]
+
+        written = []
+        for name, table in self.tables().items():
+            table_path = f"{stem}_{name}{ext or '.' + fmt}"
+            if name == 'matrix':
+                _write_wide_csv(table, table_path) if fmt == 'csv' else _write_wide_parquet(table, table_path)
+            elif fmt == 'csv':
+                table.to_csv(table_path)
+            else:
+                table.to_parquet(table_path)
+            written.append(table_path)
+        return written
+
+    def write_excel(self, target) -> List[str]:
+        """
+        Write all tables as sheets of one workbook to a path or binary buffer.
+        openpyxl's write-only mode streams rows and leaves blank cells out, which is
+        what makes a large, mostly empty clause x file matrix practical in Excel.
+        Returns:
+            List[str]: Tables left out for having more columns than Excel allows (see excel_omitted).
+        """
+        from openpyxl import Workbook
+
+        omitted = self.excel_omitted
+        workbook = Workbook(write_only=True)
+        for name, table in self.tables().items():
+            if name in omitted:
+                continue
+            sheet = workbook.create_sheet(name)
+            flat = table.reset_index()
+            sheet.append([str(column) for column in flat.columns])
+            values = flat.astype(object).where(flat.notna(), None).to_numpy()
+            values[values == ''] = None
+            for row in values.tolist():
+                sheet.append(row)
+        workbook.save(target)
+        return omitted
+
+    def excel_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        self.write_excel(buffer)
+        return buffer.getvalue()
+
+
+def coverage_diff(db: AuditDB, old_guideline_id: int, new_guideline_id: int,
+                  evidence: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Compare clause coverage between two guideline versions.
+    Args:
+        db (AuditDB): Database holding both versions.
+        old_guideline_id (int): Earlier version.
+        new_guideline_id (int): Later version.
+        evidence (pd.DataFrame): Output of load_evidence, to reuse an already loaded frame.
+    Returns:
+        pd.DataFrame: One row per clause in either version with status_old, status_new,
+                      description_old, description_new and change
+                      ('added', 'removed', 'description changed' or 'unchanged').
+    """
+    evidence = load_evidence(db) if evidence is None else evidence
+    old = clause_status(coverage_pairs(load_clauses(db, old_guideline_id), evidence))
+    new = clause_status(coverage_pairs(load_clauses(db, new_guideline_id), evidence))
+    diff = old[['status', 'description']].merge(new[['status', 'description']], how='outer', left_index=True,
+                                                right_index=True, suffixes=('_old', '_new'), indicator=True)
+    # Order: the new version's clauses first, then those it dropped
+    diff = diff.reindex(new.index.append(old.index.difference(new.index, sort=False)))
+    diff['change'] = np.select(
+        [diff['_merge'] == 'right_only', diff['_merge'] == 'left_only',
+         diff['description_old'].fillna('') != diff['description_new'].fillna('')],
+        ['added', 'removed', 'description changed'], 'unchanged')
+    return diff.drop(columns=['_merge'])
+
+
+def build_coverage_report(db: AuditDB = None, guideline_id: int = None,
+                          diff_from: int = None) -> CoverageReport:
+    """
+    Coverage report for a guideline version.
+    Args:
+        db (AuditDB): Database, defaults to uploads/audit.db.
+        guideline_id (int): Guideline version, defaults to the latest loaded.
+        diff_from (int): Earlier version to diff against (adds the 'diff' table).
+    Returns:
+        CoverageReport: Status, matrix, pairs and optional diff tables.
+    """
+    db = db or get_default_db()
+    versions = {version['id']: version for version in db.guideline_versions()}
+    if not versions:
+        raise ValueError("No guideline has been processed yet")
+    if guideline_id is None:
+        guideline_id = db.latest_guideline()['id']
+    for version_id in (guideline_id, diff_from):
+        if version_id is not None and version_id not in versions:
+            raise ValueError(f"Unknown guideline version {version_id}")
+
+    evidence = load_evidence(db)
+    diff = coverage_diff(db, diff_from, guideline_id, evidence) if diff_from is not None else None
+    return CoverageReport(versions[guideline_id], load_clauses(db, guideline_id), evidence, diff)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Clause coverage report from the audit database")
+    parser.add_argument("output", nargs="?", help="report file: .xlsx, .csv or .parquet")
+    parser.add_argument("--guideline-id", type=int, help="guideline version (default: latest)")
+    parser.add_argument("--diff-from", type=int, metavar="ID", help="also diff against this earlier version")
+    parser.add_argument("--list", action="store_true", help="list guideline versions and exit")
+    parser.add_argument("--db", help="audit database path (default: uploads/audit.db)")
+    args = parser.parse_args(argv)
+
+    db = AuditDB(args.db) if args.db else get_default_db()
+    if args.list:
+        for version in db.guideline_versions():
+            print(f"{version['id']}\t{version['loaded_at']}\t{version['clause_count']} clauses\t{version['name']}")
+        return 0
+    if not args.output:
+        parser.error("an output file is required unless --list is given")
+
+    try:
+        report = build_coverage_report(db, args.guideline_id, args.diff_from)
+        written = report.export(args.output)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if EXPORT_FORMATS.get(os.path.splitext(args.output)[1].lower()) == 'excel':
+        for name in report.excel_omitted:
+            print(f"❌ The {name} table has more columns than Excel allows and was left out; "
+                  f"export to CSV or Parquet to get it", file=sys.stderr)
+    summary = report.summary
+    print(f"✅ {summary['clauses']} clauses of {summary['guideline']}: {summary['signed']} signed, "
+          f"{summary['unsigned']} unsigned, {summary['not analyzed']} not analyzed, "
+          f"{summary['no evidence']} without evidence", file=sys.stderr)
+    for path in written:
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
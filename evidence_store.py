@@ -0,0 +1,213 @@
+"""
+Content-addressed storage for uploaded evidence and guideline files.
+
+Each distinct file is stored once under its SHA-256 in blobs/<first two hex
+digits>/, so re-uploading the same bytes costs nothing. An append-only
+index.jsonl records every upload (original name, clause, kind, time) against
+its blob and is loaded into dicts for fast lookup by hash, clause or name.
+
+Existing timestamped uploads can be folded in with:
+
+    python evidence_store.py import uploads/prepared_docs --kind prepared_docs --remove
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, List, Any
+
+DEFAULT_STORE_DIR = os.path.join("uploads", "store")
+
+# Prefix save_uploaded_file used to put on upload names: YYYYmmdd_HHMMSS_
+_TIMESTAMP_PREFIX = re.compile(r'^(\d{8}_\d{6})_(.+)$')
+
+
+class EvidenceStore:
+    """
+    Deduplicating blob store plus an upload index.
+    Safe to use from several threads; several processes may share a store
+    since index lines are appended atomically and each instance picks up
+    lines written by others before answering a lookup.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.index_path = os.path.join(root, "index.jsonl")
+        self._lock = threading.RLock()
+        self._index_offset = 0
+        self.records: List[Dict[str, Any]] = []
+        self.by_hash: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_clause: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_name: Dict[str, List[Dict[str, Any]]] = {}
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Load index lines appended since the last read."""
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_offset)
+                data = f.read()
+            # Only consume complete lines; a partial one is still being written
+            complete = data[:data.rfind(b"\n") + 1]
+            self._index_offset += len(complete)
+            for line in complete.decode("utf-8").splitlines():
+                try:
+                    self._add_to_index(json.loads(line))
+                except ValueError:
+                    continue
+
+    def _add_to_index(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+        self.by_hash.setdefault(record['sha256'], []).append(record)
+        self.by_name.setdefault(record['name'], []).append(record)
+        if record.get('clause') is not None:
+            self.by_clause.setdefault(record['clause'], []).append(record)
+
+    def blob_path(self, sha256: str, extension: str = "") -> str:
+        """Path of the blob for a hash; an existing blob keeps the extension it was first stored with."""
+        with self._lock:
+            known = self.by_hash.get(sha256)
+        if known:
+            return known[0]['path']
+        return os.path.join(self.blob_dir, sha256[:2], sha256 + extension.lower())
+
+    def put(self, data, name: str, kind: str, clause: Any = None, sha256: str = None,
+            uploaded_at: str = None) -> Dict[str, Any]:
+        """
+        Store file contents (deduplicated) and record the upload.
+        Args:
+            data: Bytes-like file contents; read in place, never copied.
+            name (str): Original file name.
+            kind (str): Upload category, e.g. 'prepared_docs' or 'compliance_guidelines'.
+            clause: Clause the evidence belongs to, if any.
+            sha256 (str): Precomputed hash of data, if the caller already has it.
+            uploaded_at (str): ISO timestamp, defaults to now.
+        Returns:
+            Dict: The index record, including 'path' of the blob and 'duplicate'.
+        """
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha256, os.path.splitext(name)[1])
+        duplicate = os.path.exists(path)
+        if not duplicate:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        record = {
+            'sha256': sha256,
+            'name': name,
+            'kind': kind,
+            'clause': None if clause is None else str(clause),
+            'uploaded_at': uploaded_at or datetime.now().isoformat(timespec="seconds"),
+            'size': memoryview(data).nbytes,
+            'path': path,
+        }
+        with self._lock:
+            self._refresh()
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                self._index_offset = f.tell()
+            self._add_to_index(record)
+        return {**record, 'duplicate': duplicate}
+
+    def find_by_hash(self, sha256: str) -> List[Dict[str, Any]]:
+        """All uploads of the given content."""
+        self._refresh()
+        return list(self.by_hash.get(sha256, []))
+
+    def find_by_clause(self, clause: Any) -> List[Dict[str, Any]]:
+        """All uploads recorded against a clause."""
+        self._refresh()
+        return list(self.by_clause.get(str(clause), []))
+
+    def find_by_name(self, name: str) -> List[Dict[str, Any]]:
+        """All uploads with the given original file name."""
+        self._refresh()
+        return list(self.by_name.get(name, []))
+
+    def stats(self) -> Dict[str, Any]:
+        """Uploads, distinct blobs, and bytes saved by deduplication."""
+        self._refresh()
+        uploaded = sum(record['size'] for record in self.records)
+        stored = sum(records[0]['size'] for records in self.by_hash.values())
+        return {'uploads': len(self.records), 'blobs': len(self.by_hash),
+                'uploaded_bytes': uploaded, 'stored_bytes': stored, 'saved_bytes': uploaded - stored}
+
+    def import_directory(self, directory: str, kind: str, remove: bool = False) -> Dict[str, int]:
+        """
+        Fold legacy timestamped uploads into the store.
+        The YYYYmmdd_HHMMSS_ prefix becomes the upload time and is dropped from the name.
+        Args:
+            directory (str): Folder of legacy uploads, e.g. uploads/prepared_docs.
+            kind (str): Upload category to record.
+            remove (bool): Delete each original once its blob is stored.
+        Returns:
+            Dict: Counts of imported files and duplicates.
+        """
+        counts = {'imported': 0, 'duplicates': 0}
+        for filename in sorted(os.listdir(directory)):
+            file_path = os.path.join(directory, filename)
+            if not os.path.isfile(file_path):
+                continue
+            match = _TIMESTAMP_PREFIX.match(filename)
+            name, uploaded_at = filename, None
+            if match:
+                name = match.group(2)
+                uploaded_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat()
+            with open(file_path, "rb") as f:
+                record = self.put(f.read(), name, kind, uploaded_at=uploaded_at)
+            counts['imported'] += 1
+            counts['duplicates'] += record['duplicate']
+            if remove:
+                os.remove(file_path)
+        return counts
+
+
+_default_store = None
+
+
+def get_default_store() -> EvidenceStore:
+    """Process-wide store under uploads/store."""
+    global _default_store
+    if _default_store is None:
+        _default_store = EvidenceStore()
+    return _default_store
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Content-addressed evidence store")
+    parser.add_argument("--root", default=DEFAULT_STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="fold a folder of legacy uploads into the store")
+    importer.add_argument("directory")
+    importer.add_argument("--kind", required=True)
+    importer.add_argument("--remove", action="store_true", help="delete originals after storing")
+    commands.add_parser("stats", help="show deduplication statistics")
+    args = parser.parse_args(argv)
+
+    store = EvidenceStore(args.root)
+    if args.command == "import":
+        counts = store.import_directory(args.directory, args.kind, args.remove)
+        print(f"✅ Imported {counts['imported']} files ({counts['duplicates']} duplicates)")
+    print(json.dumps(store.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Incremental analysis of an evidence folder.
+
+A manifest records each PDF's mtime, size, SHA-256 and latest verdict, so a
+pass only re-analyzes new or changed files (on a process pool) and forgets
+deleted ones. After every pass a clause compliance summary is written next
+to the manifest. Run once from a scheduler, or keep watching:
+
+    python evidence_watcher.py pdf_folder/                 # one incremental pass
+    python evidence_watcher.py pdf_folder/ --watch 300     # re-check every 5 minutes
+
+Files are assigned to clauses by their subfolder (pdf_folder/1.01/policy.pdf),
+a clause-number file name prefix (1.01_policy.pdf), or the clause they were
+last uploaded for in the app.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from audit_db import get_default_db
+from batch_cli import analyze_file, collect_pdf_paths
+from excel_processor import load_guideline, normalize_clause_number
+from pdf_processor import DEFAULT_TEXT_BACKEND, TEXT_BACKENDS
+from result_cache import detector_fingerprint, file_sha256
+
+MANIFEST_NAME = ".pbsa_manifest.json"
+SUMMARY_NAME = ".pbsa_compliance.json"
+MANIFEST_VERSION = 1
+
+# Manifest is rewritten after this many analyses, so an interrupted pass keeps its progress
+_SAVE_EVERY = 25
+
+# Clause number at the start of a file name: "1.01_policy.pdf", "2 - roster.pdf"
+_CLAUSE_PREFIX = re.compile(r'^(\d+(?:\.\d+)*)[\s_\-]')
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    """Write JSON atomically, so readers never see a half-written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_manifest(path: str, fingerprint: str) -> Dict[str, Any]:
+    """
+    Read a manifest, or start an empty one.
+    Entries made with different detector code or options are dropped, so
+    every file is re-analyzed after the detectors change.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('fingerprint') != fingerprint:
+        manifest = {'version': MANIFEST_VERSION, 'fingerprint': fingerprint, 'files': {}}
+    return manifest
+
+
+def scan_changes(directory: str, manifest: Dict[str, Any], recursive: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    Compare the folder with the manifest.
+    Files whose mtime and size match are trusted without reading them; for the
+    rest the content hash decides, so a touched but unchanged file is not re-analyzed.
+    Args:
+        directory (str): Evidence folder.
+        manifest (Dict): Manifest from load_manifest; entries of unchanged files are refreshed in place.
+        recursive (bool): Include subfolders.
+    Returns:
+        Tuple[List[str], List[str]]: Relative paths to analyze, and relative paths that were deleted.
+    """
+    entries = manifest['files']
+    seen = set()
+    changed = []
+    for path in collect_pdf_paths([directory], recursive):
+        relative = os.path.relpath(path, directory)
+        seen.add(relative)
+        stat = os.stat(path)
+        entry = entries.get(relative)
+        # Pending entries were cut off by an interrupted pass
+        if (entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size
+                and entry['status'] != 'pending'):
+            continue
+        sha256 = file_sha256(path)
+        if entry and entry['sha256'] == sha256 and entry.get('status') == 'ok':
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            continue
+        entries[relative] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha256, 'status': 'pending'}
+        changed.append(relative)
+
+    deleted = sorted(set(entries) - seen)
+    for relative in deleted:
+        del entries[relative]
+    return changed, deleted
+
+
+def clause_for_file(relative: str, sha256: str, clauses: Iterable[str] = None, db=None) -> Optional[str]:
+    """
+    Clause a PDF is evidence for: its top-level subfolder or file name prefix
+    (when it is a known clause, or any clause if none are known), else the
+    clause it was last uploaded for in the app.
+    """
+    known = set(clauses or [])
+    parts = relative.split(os.sep)
+    candidates = [parts[0]] if len(parts) > 1 else []
+    match = _CLAUSE_PREFIX.match(parts[-1])
+    if match:
+        candidates.append(match.group(1))
+    for candidate in candidates:
+        clause = normalize_clause_number(candidate)
+        if clause and (not known or clause in known):
+            return clause
+    return db.clause_for_evidence(sha256) if db is not None else None
+
+
+def build_compliance_summary(directory: str, manifest: Dict[str, Any], clauses: List[str] = None,
+                             guideline_name: str = None) -> Dict[str, Any]:
+    """
+    Per-clause view of the manifest: which files back each clause and whether any is signed.
+    Args:
+        directory (str): Evidence folder.
+        manifest (Dict): Current manifest.
+        clauses (List[str]): Guideline clauses in order; clauses without files are listed too.
+        guideline_name (str): Guideline the clauses came from, for the report.
+    Returns:
+        Dict: Totals, 'clauses' {clause: {'files', 'signed_files', 'signed', 'best_confidence'}},
+              'clauses_lacking_signed_evidence' and 'unassigned_files'.
+    """
+    confidence_rank = {'low': 0, 'medium': 1, 'high': 2}
+    by_clause = {clause: {'files': [], 'signed_files': [], 'signed': False, 'best_confidence': None}
+                 for clause in clauses or []}
+    unassigned = []
+    entries = manifest['files']
+    for relative in sorted(entries):
+        entry = entries[relative]
+        if entry.get('clause') is None:
+            unassigned.append(relative)
+            continue
+        summary = by_clause.setdefault(entry['clause'], {'files': [], 'signed_files': [], 'signed': False,
+                                                         'best_confidence': None})
+        summary['files'].append(relative)
+        if entry.get('has_signatures'):
+            summary['signed_files'].append(relative)
+            summary['signed'] = True
+        confidence = entry.get('confidence')
+        if confidence and confidence_rank[confidence] > confidence_rank.get(summary['best_confidence'], -1):
+            summary['best_confidence'] = confidence
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec="seconds"),
+        'directory': os.path.abspath(directory),
+        'guideline': guideline_name,
+        'files': len(entries),
+        'signed_files': sum(bool(entry.get('has_signatures')) for entry in entries.values()),
+        'errors': sum(entry.get('status') == 'error' for entry in entries.values()),
+        'clauses': by_clause,
+        'clauses_lacking_signed_evidence': [clause for clause, summary in by_clause.items() if not summary['signed']],
+        'unassigned_files': unassigned,
+    }
+
+
+def sync_folder(directory: str, manifest_path: str = None, summary_path: str = None, workers: int = None,
+                text_backend: str = DEFAULT_TEXT_BACKEND, recursive: bool = False, clauses: List[str] = None,
+                guideline_name: str = None) -> Dict[str, int]:
+    """
+    One incremental pass: analyze new and changed PDFs, forget deleted ones,
+    then write the manifest and the compliance summary.
+    Args:
+        directory (str): Evidence folder.
+        manifest_path (str): Manifest file, defaults to MANIFEST_NAME inside the folder.
+        summary_path (str): Summary file, defaults to SUMMARY_NAME inside the folder.
+        workers (int): Pool size, defaults to the number of cores.
+        text_backend (str): Text extraction backend.
+        recursive (bool): Include subfolders.
+        clauses (List[str]): Guideline clauses for assigning files and the summary.
+        guideline_name (str): Guideline name for the summary.
+    Returns:
+        Dict: Counts of analyzed, unchanged, deleted and failed files.
+    """
+    manifest_path = manifest_path or os.path.join(directory, MANIFEST_NAME)
+    summary_path = summary_path or os.path.join(directory, SUMMARY_NAME)
+    manifest = load_manifest(manifest_path, detector_fingerprint(text_backend=text_backend))
+    changed, deleted = scan_changes(directory, manifest, recursive)
+    entries = manifest['files']
+    counts = {'analyzed': 0, 'unchanged': len(entries) - len(changed), 'deleted': len(deleted), 'errors': 0}
+    db = get_default_db()
+
+    if changed:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(changed))) as pool:
+            futures = {pool.submit(analyze_file, os.path.join(directory, relative), text_backend, True): relative
+                       for relative in changed}
+            for future in as_completed(futures):
+                relative = futures[future]
+                record = future.result()
+                entry = entries[relative]
+                entry.update(status=record['status'], analyzed_at=datetime.now().isoformat(timespec="seconds"))
+                if record['status'] == 'ok':
+                    results = record['results']
+                    entry.update(has_signatures=results['has_signatures'], confidence=results['confidence'],
+                                 methods=[method for method, found in results['signature_methods'].items() if found])
+                    entry.pop('error', None)
+                else:
+                    entry['error'] = record['error']
+                    counts['errors'] += 1
+                counts['analyzed'] += 1
+                print(f"[{counts['analyzed']}/{len(changed)}] {record['status']}: {relative}", file=sys.stderr)
+                if counts['analyzed'] % _SAVE_EVERY == 0:
+                    _write_json(manifest_path, manifest)
+
+    # Reassigned every pass, so a new guideline or app upload takes effect without re-analysis
+    for relative, entry in entries.items():
+        entry['clause'] = clause_for_file(relative, entry['sha256'], clauses, db)
+    _write_json(manifest_path, manifest)
+    _write_json(summary_path, build_compliance_summary(directory, manifest, clauses, guideline_name))
+    return counts
+
+
+def _guideline_clauses(guideline_path: str = None) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Clauses from a guideline file, or from the guideline last processed in the app."""
+    if guideline_path:
+        return load_guideline(guideline_path).section_numbers, os.path.basename(guideline_path)
+    latest = get_default_db().latest_guideline()
+    if latest:
+        return latest['clauses'], latest['name']
+    return None, None
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Incremental signature analysis of an evidence folder")
+    parser.add_argument("directory", help="evidence folder, e.g. pdf_folder/")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="keep running, re-checking the folder every SECONDS")
+    parser.add_argument("--manifest", help=f"manifest path (default: DIRECTORY/{MANIFEST_NAME})")
+    parser.add_argument("--summary", help=f"compliance summary path (default: DIRECTORY/{SUMMARY_NAME})")
+    parser.add_argument("--guideline", help="guideline file to take clauses from (default: last one processed in the app)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="descend into subfolders (needed for clause folders)")
+    parser.add_argument("--text-backend", choices=sorted(TEXT_BACKENDS), default=DEFAULT_TEXT_BACKEND)
+    parser.add_argument("--log-level", default="WARNING", help="logging level for pdf_processor (e.g. DEBUG)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+
+    while True:
+        clauses, guideline_name = _guideline_clauses(args.guideline)
+        counts = sync_folder(args.directory, args.manifest, args.summary, args.workers, args.text_backend,
+                             args.recursive, clauses, guideline_name)
+        print(f"✅ {counts['analyzed']} analyzed, {counts['unchanged']} unchanged, {counts['deleted']} deleted, "
+              f"{counts['errors']} errors", file=sys.stderr)
+        if not args.watch:
+            return 1 if counts['errors'] else 0
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
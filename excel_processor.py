@@ -1,5 +1,8 @@
 import pandas as pd
+import math
 import os
+from cachetools import LRUCache
+from result_cache import file_sha256
 
 def read_excel_or_csv(file_path):
     df = pd.read_excel(file_path, skiprows = 1) \
@@ -26,6 +29,100 @@ def get_clause_text(df, clause_number):
     else:
         return "No description found for this clause."
 
+# Columns the app actually uses from the guideline workbook
+CLAUSE_COL = 'Clause #'
+DESCRIPTION_COL = 'Potential Verification for Onsite Audit'
+
+# Parsed guidelines kept in memory, keyed by file hash
+_guideline_cache = LRUCache(maxsize=8)
+
+
+def normalize_clause_number(value):
+    """
+    Canonical string form of a clause number, so 1.01 read as a float and
+    "1.01" read as text compare equal. Returns None for blanks.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return repr(float(value))
+    text = str(value).strip()
+    return text or None
+
+def read_guideline_columns(file_path):
+    """Read only the clause and description columns, falling back to the whole sheet if they are missing."""
+    reader = pd.read_excel if file_path.endswith(('.xls', '.xlsx')) else pd.read_csv
+    try:
+        return reader(file_path, skiprows = 1, usecols = [CLAUSE_COL, DESCRIPTION_COL])
+    except ValueError:
+        return reader(file_path, skiprows = 1)
+
+class Guideline:
+    """
+    A parsed compliance guideline: clause numbers in file order plus a
+    clause number -> description index, so lookups do not scan the DataFrame.
+    """
+    def __init__(self, df, source_hash=None):
+        self.df = df
+        self.source_hash = source_hash
+        self.section_numbers = []
+        self.descriptions = {}
+
+        descriptions = df[DESCRIPTION_COL] if DESCRIPTION_COL in df.columns else [None] * len(df)
+        for clause, description in zip(df[CLAUSE_COL], descriptions):
+            key = normalize_clause_number(clause)
+            if key is None or key in self.descriptions:
+                continue  # first row wins, as in get_clause_text
+            self.section_numbers.append(key)
+            self.descriptions[key] = description
+
+    def __len__(self):
+        return len(self.section_numbers)
+
+    def get_clause_text(self, clause_number):
+        """Return the description text for a clause number in any of its forms."""
+        description = self.descriptions.get(normalize_clause_number(clause_number))
+        if description is None or pd.isna(description):
+            return "No description found for this clause."
+        return description
+
+def load_guideline(file_path, use_sidecar=True):
+    """
+    Parse a guideline file once per distinct content.
+    Results are cached in memory by file hash and, with use_sidecar, persisted
+    as a Parquet file next to the upload so later sessions skip openpyxl.
+    """
+    source_hash = file_sha256(file_path)
+    if source_hash in _guideline_cache:
+        return _guideline_cache[source_hash]
+
+    sidecar = os.path.join(os.path.dirname(file_path), f".{source_hash[:32]}.guideline.parquet")
+    df = None
+    if use_sidecar and os.path.exists(sidecar):
+        try:
+            df = pd.read_parquet(sidecar)
+        except Exception as e:
+            print(f"❌ Error reading guideline sidecar '{sidecar}': {e}")
+
+    if df is None:
+        df = read_guideline_columns(file_path)
+        if use_sidecar:
+            try:
+                # Clause numbers mix floats and text, so store them normalized
+                sidecar_df = pd.DataFrame({
+                    CLAUSE_COL: [normalize_clause_number(v) for v in df[CLAUSE_COL]],
+                    DESCRIPTION_COL: df[DESCRIPTION_COL].astype("string") if DESCRIPTION_COL in df.columns else None,
+                })
+                sidecar_df.to_parquet(sidecar, index=False)
+            except Exception as e:
+                print(f"❌ Error writing guideline sidecar '{sidecar}': {e}")
+
+    guideline = Guideline(df, source_hash)
+    _guideline_cache[source_hash] = guideline
+    return guideline
+
 '''
 # Test function
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+"""
+Visual detection of wet-ink and pasted-image signatures.
+
+The other detectors read a PDF's structure and text, so a scanned page with a
+handwritten signature, or a signature image pasted onto a page, goes unseen.
+This detector renders only the small regions where a signature is likely at
+low DPI: around "Signature:" / "Signed by" labels, inside empty signature
+widgets and Ink annotations, and along the bottom of text-less scanned pages.
+Each region is scored for handwriting-like ink with vectorized NumPy, and a
+page budget keeps batch runs fast.
+"""
+import re
+from typing import Dict, List, Any, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from pdf_processor import PageVisitor, PdfSource, scan_document
+
+# Resolution candidate regions are rendered at; ~1 pixel per point
+INK_RENDER_DPI = 72
+# Pages with candidate regions rendered per document unless the caller says otherwise
+DEFAULT_INK_PAGE_BUDGET = 20
+MAX_REGIONS_PER_PAGE = 6
+
+# Labels that usually sit next to a signature
+_ANCHOR_RE = re.compile(r'signature|signed\s+by|sign\s+here|signatory|authori[sz]ed\s+by|/s/', re.IGNORECASE)
+# Region searched around a label, in points: left, above, right, below
+_ANCHOR_MARGIN = (20, 60, 260, 50)
+# Share of a scanned page (from the bottom) searched when it has no text layer
+_SCANNED_PAGE_BAND = 0.45
+
+# Scoring parameters, in points where they describe sizes
+INK_LEVEL = 170           # grey level below which a pixel can be ink
+INK_CONTRAST = 50         # ...and at least this much darker than the region's median
+MIN_COMPONENT_PIXELS = 4  # smaller specks are scan noise
+MIN_INK_HEIGHT_PT = 14    # handwriting strokes are taller than body-text glyphs
+MAX_STROKE_FILL = 0.3     # share of a stroke's bounding box it fills; solid shapes fill more
+MIN_HANDWRITING_PIXELS = 40
+INK_SCORE_THRESHOLD = 0.25
+
+_NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+
+def label_components(mask: np.ndarray) -> np.ndarray:
+    """
+    Label 8-connected components of a boolean mask.
+    Labels spread by taking the minimum over neighbours, with pointer jumping
+    so long strokes converge in a few whole-array steps.
+    Returns:
+        np.ndarray: Per-pixel labels (the flat index of the component's first pixel);
+                    background pixels hold mask.size.
+    """
+    height, width = mask.shape
+    background = mask.size
+    labels = np.where(mask, np.arange(mask.size).reshape(mask.shape), background)
+    for _ in range(max(mask.shape)):
+        padded = np.pad(labels, 1, constant_values=background)
+        spread = labels.copy()
+        for dy, dx in _NEIGHBOURS:
+            np.minimum(spread, padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width], out=spread)
+        spread = np.where(mask, spread, background)
+        flat = spread.ravel()
+        foreground = flat < background
+        for _ in range(4):
+            flat[foreground] = flat[flat[foreground]]
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+    return labels
+
+
+def score_ink(gray: np.ndarray, dpi: int = INK_RENDER_DPI) -> Dict[str, Any]:
+    """
+    Score a greyscale region for handwriting-like ink.
+    Ink pixels are grouped into connected components; printed glyphs, ruled
+    lines, boxes and solid shapes are discounted, leaving tall, thin-stroked
+    components typical of a signature.
+    Args:
+        gray (np.ndarray): 2-D uint8 image, 255 = white.
+        dpi (int): Resolution the region was rendered at.
+    Returns:
+        Dict: 'score' (share of ink in handwriting-like components), 'ink_density',
+              'components', 'handwriting_components' and 'found'.
+    """
+    scale = dpi / 72
+    threshold = min(INK_LEVEL, float(np.median(gray)) - INK_CONTRAST)
+    ink = gray < threshold
+    result = {'score': 0.0, 'ink_density': round(float(ink.mean()), 4) if ink.size else 0.0,
+              'components': 0, 'handwriting_components': 0, 'found': False}
+    if ink.sum() < MIN_HANDWRITING_PIXELS:
+        return result
+
+    labels = label_components(ink)
+    ys, xs = np.nonzero(ink)
+    _, component = np.unique(labels[ys, xs], return_inverse=True)
+    sizes = np.bincount(component)
+    order = np.argsort(component, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    ymin, ymax = np.minimum.reduceat(ys[order], starts), np.maximum.reduceat(ys[order], starts)
+    xmin, xmax = np.minimum.reduceat(xs[order], starts), np.maximum.reduceat(xs[order], starts)
+    heights, widths = ymax - ymin + 1, xmax - xmin + 1
+    fill = sizes / (heights * widths)
+    # Ruled lines and box outlines run the full width of their top and bottom rows
+    top_fill = np.bincount(component, weights=ys == ymin[component]) / widths
+    bottom_fill = np.bincount(component, weights=ys == ymax[component]) / widths
+
+    kept = (sizes >= MIN_COMPONENT_PIXELS) & ~((top_fill > 0.7) & (bottom_fill > 0.7))
+    handwriting = kept & (heights >= MIN_INK_HEIGHT_PT * scale) & (fill <= MAX_STROKE_FILL)
+    kept_pixels = sizes[kept].sum()
+    handwriting_pixels = sizes[handwriting].sum()
+
+    result['components'] = int(kept.sum())
+    result['handwriting_components'] = int(handwriting.sum())
+    if kept_pixels:
+        result['score'] = round(float(handwriting_pixels / kept_pixels), 3)
+    result['found'] = bool(handwriting_pixels >= MIN_HANDWRITING_PIXELS * scale * scale
+                           and result['score'] >= INK_SCORE_THRESHOLD)
+    return result
+
+
+def _merge_regions(regions: List[Tuple[str, fitz.Rect]]) -> List[Tuple[str, fitz.Rect]]:
+    """Union overlapping regions so no area is rendered twice."""
+    merged = []
+    for source, rect in regions:
+        for index, (merged_source, merged_rect) in enumerate(merged):
+            if merged_rect.intersects(rect):
+                merged[index] = (merged_source, merged_rect | rect)
+                break
+        else:
+            merged.append((source, fitz.Rect(rect)))
+    return merged
+
+
+def candidate_regions(page: fitz.Page, widgets: List[Any] = None) -> List[Tuple[str, fitz.Rect]]:
+    """
+    Areas of a page where a visual signature is likely, as (source, rect) pairs.
+    Sources are 'widget' (empty signature field), 'ink_annotation', 'label'
+    (near signature wording) and 'scanned_page' (bottom of a page with no text).
+    """
+    regions = []
+    for widget in widgets or []:
+        if widget.field_type == fitz.PDF_WIDGET_TYPE_SIGNATURE and not widget.field_value:
+            regions.append(('widget', widget.rect + (-10, -10, 10, 10)))
+    for annot in page.annots(types=[fitz.PDF_ANNOT_INK]):
+        regions.append(('ink_annotation', annot.rect + (-5, -5, 5, 5)))
+
+    # One text extraction serves both the block scan and the label search
+    textpage = page.get_textpage()
+    blocks = page.get_text("blocks", textpage=textpage)
+    left, above, right, below = _ANCHOR_MARGIN
+    for block in blocks:
+        match = _ANCHOR_RE.search(block[4])
+        if not match:
+            continue
+        block_rect = fitz.Rect(block[:4])
+        for anchor in page.search_for(match.group(), clip=block_rect, textpage=textpage)[:2] or [block_rect]:
+            regions.append(('label', anchor + (-left, -above, right, below)))
+
+    if not blocks:
+        for image in page.get_image_info():
+            bbox = fitz.Rect(image['bbox'])
+            if bbox.get_area() >= 0.5 * page.rect.get_area():
+                regions.append(('scanned_page', fitz.Rect(bbox.x0, bbox.y1 - bbox.height * _SCANNED_PAGE_BAND,
+                                                          bbox.x1, bbox.y1)))
+                break
+
+    regions = [(source, rect & page.rect) for source, rect in regions]
+    return _merge_regions([(source, rect) for source, rect in regions if not rect.is_empty])[:MAX_REGIONS_PER_PAGE]
+
+
+def render_region(page: fitz.Page, rect: fitz.Rect, dpi: int = INK_RENDER_DPI) -> np.ndarray:
+    """Render one page region to a 2-D greyscale array."""
+    pix = page.get_pixmap(dpi=dpi, clip=rect, colorspace=fitz.csGRAY, alpha=False)
+    # pix.samples is a copy, so the array stays valid after the pixmap is freed
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+class VisualInkVisitor(PageVisitor):
+    """Renders candidate regions and looks for handwriting-like ink."""
+    name = 'visual_ink'
+    error_label = 'visual ink signatures'
+    uses_widgets = True
+
+    def __init__(self, page_budget: int = DEFAULT_INK_PAGE_BUDGET, dpi: int = INK_RENDER_DPI):
+        self.page_budget = page_budget
+        self.dpi = dpi
+        self.result = {'found': False, 'regions': [], 'count': 0, 'pages_rendered': 0, 'regions_rendered': 0,
+                       'budget_exhausted': False}
+
+    def visit_page(self, page_num, page, widgets):
+        if self.result['pages_rendered'] >= self.page_budget:
+            self.result['budget_exhausted'] = True
+            return
+        regions = candidate_regions(page, widgets)
+        if not regions:
+            return
+        self.result['pages_rendered'] += 1
+        for source, rect in regions:
+            score = score_ink(render_region(page, rect, self.dpi), self.dpi)
+            self.result['regions_rendered'] += 1
+            if score.pop('found'):
+                self.result['found'] = True
+                self.result['regions'].append({'page': page_num + 1, 'source': source, 'rect': rect, **score})
+
+    def finish(self):
+        self.result['count'] = len(self.result['regions'])
+        return self.result
+
+    def extra_metrics(self):
+        return {'pages_rendered': self.result['pages_rendered'], 'regions_rendered': self.result['regions_rendered']}
+
+
+def detect_signature_ink(file_path: PdfSource, page_budget: int = DEFAULT_INK_PAGE_BUDGET,
+                         dpi: int = INK_RENDER_DPI) -> Dict[str, Any]:
+    """
+    Detect wet-ink and pasted-image signatures from rendered page regions.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        page_budget (int): Most pages to render regions on.
+        dpi (int): Render resolution.
+    Returns:
+        Dict: Information about regions that look hand-signed.
+    """
+    return scan_document(file_path, [VisualInkVisitor(page_budget, dpi)])['visual_ink']
@@ -0,0 +1,260 @@
+"""
+Crash- and hang-isolated signature analysis.
+
+Each document is analyzed in a supervised worker process. The supervisor
+enforces a wall-clock timeout and a resident-memory limit per document, kills
+a worker that exceeds either (or dies), and reports the document with
+whatever the worker had finished before it was stopped. Workers are
+recycled after a number of documents so leaks in the PDF libraries cannot
+build up.
+
+Analysis runs in two stages (see pdf_processor.detect_signatures_staged):
+the cheap structural methods report first, so a file that hangs during
+text extraction still comes back with its digital signature, form field and
+annotation findings.
+"""
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+
+from pdf_processor import DEFAULT_TEXT_BACKEND, PdfSource, detect_signatures_staged
+
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_MAX_RSS_MB = 2048
+DEFAULT_MAX_DOCS_PER_WORKER = 50
+
+# How often the supervisor checks time and memory while waiting for results
+_POLL_INTERVAL = 0.1
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process from /proc, or None where that is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker_main(conn, defaults: Dict[str, Any]) -> None:
+    """Worker loop: analyze documents sent over conn until told to stop."""
+    supervisor = os.getppid()
+    while True:
+        # A forked worker holds copies of the supervisor's pipe ends, so it never sees EOF
+        # if the supervisor is killed; notice the re-parenting instead
+        while not conn.poll(_POLL_INTERVAL * 10):
+            if os.getppid() != supervisor:
+                return
+        task = conn.recv()
+        if task is None:
+            return
+        task_id, source, overrides = task
+        options = {**defaults, **(overrides or {})}
+        try:
+            key = results = cache = None
+            if options['use_cache']:
+                from result_cache import analysis_options, content_sha256, get_default_cache
+                cache = get_default_cache()
+                key = cache.key_for(content_sha256(source), **analysis_options(
+                    options['text_backend'], include_timings=options['include_timings'],
+                    verify_signatures=options['verify_signatures'], visual_ink_pages=options['visual_ink_pages']))
+                results = cache.get(key)
+            if results is None:
+                results = detect_signatures_staged(
+                    source, options['text_backend'], lambda partial: conn.send(('partial', task_id, partial)),
+                    options['include_timings'], options['verify_signatures'], options['visual_ink_pages'])
+                if key is not None:
+                    cache.put(key, results)
+            conn.send(('ok', task_id, results))
+        except Exception as e:
+            conn.send(('error', task_id, str(e)))
+
+
+class _Worker:
+    """One supervised process and the document it is working on."""
+
+    def __init__(self, context, options: Dict[str, Any]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, options), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.docs = 0
+        self.task = None  # (index, name, start time)
+        self.partial = None
+
+    def assign(self, index: int, source: PdfSource, name: str, options: Dict[str, Any] = None) -> None:
+        self.task = (index, name, time.perf_counter())
+        self.partial = None
+        self.conn.send((index, source, options))
+
+    def stop(self) -> None:
+        """Ask an idle worker to exit, killing it if it does not."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class IsolatedAnalyzer:
+    """
+    Pool of supervised worker processes.
+    Records match batch_cli.analyze_file ('file', 'status', 'seconds',
+    'results' or 'error'); status is 'ok', 'error', 'timeout', 'memory_limit'
+    or 'crashed'. For the last three, 'results' holds the partial results
+    ('complete': False) if the structural stage had finished.
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, workers: int = None, timeout: float = DEFAULT_TIMEOUT, max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+                 max_docs_per_worker: int = DEFAULT_MAX_DOCS_PER_WORKER, text_backend: str = DEFAULT_TEXT_BACKEND,
+                 use_cache: bool = False, include_timings: bool = False, verify_signatures: bool = False,
+                 visual_ink_pages: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.max_docs_per_worker = max_docs_per_worker
+        self.options = {'text_backend': text_backend, 'use_cache': use_cache, 'include_timings': include_timings,
+                        'verify_signatures': verify_signatures, 'visual_ink_pages': visual_ink_pages}
+        self.stats = {'ok': 0, 'error': 0, 'timeout': 0, 'memory_limit': 0, 'crashed': 0, 'recycled': 0}
+        self._context = multiprocessing.get_context()
+        self._idle: List[_Worker] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """Stop all idle workers."""
+        for worker in self._idle:
+            worker.stop()
+        self._idle = []
+
+    def _record(self, worker: _Worker, status: str, results: Dict[str, Any] = None,
+                error: str = None) -> Tuple[int, Dict[str, Any]]:
+        index, name, start = worker.task
+        record = {'file': name, 'status': status, 'seconds': round(time.perf_counter() - start, 3)}
+        if results is not None:
+            record['results'] = results
+        if error is not None:
+            record['error'] = error
+        self.stats[status] += 1
+        worker.task = None
+        return index, record
+
+    def _check_limits(self, worker: _Worker) -> Optional[str]:
+        """Why a busy worker should be stopped, if it should."""
+        if time.perf_counter() - worker.task[2] > self.timeout:
+            return 'timeout'
+        if self.max_rss is not None:
+            rss = rss_bytes(worker.process.pid)
+            if rss is not None and rss > self.max_rss:
+                return 'memory_limit'
+        return None
+
+    def imap_unordered(self, sources: Iterable[PdfSource], names: Iterable[str] = None,
+                       options: Dict[str, Any] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Analyze documents, yielding (index, record) as each one finishes or is stopped.
+        Args:
+            sources (Iterable[PdfSource]): Paths to PDF files, or their bytes.
+            names (Iterable[str]): Values for the records' 'file' field, default the sources.
+            options (Dict): Analysis options overriding the analyzer's for these documents
+                            (text_backend, use_cache, include_timings, verify_signatures, visual_ink_pages).
+        Yields:
+            Tuple[int, Dict]: Position in sources and the document's record.
+        """
+        sources = list(sources)
+        if names is None:
+            names = [source if isinstance(source, str) else f"document {index + 1}"
+                     for index, source in enumerate(sources)]
+        queue = deque(range(len(sources)))
+        busy: Dict[Any, _Worker] = {}
+
+        try:
+            while queue or busy:
+                while queue and len(busy) < self.workers:
+                    worker = self._idle.pop() if self._idle else _Worker(self._context, self.options)
+                    index = queue.popleft()
+                    worker.assign(index, sources[index], names[index], options)
+                    busy[worker.conn] = worker
+
+                for conn in wait(list(busy), timeout=_POLL_INTERVAL):
+                    worker = busy[conn]
+                    try:
+                        kind, _, payload = conn.recv()
+                    except (EOFError, OSError):
+                        # The process died mid-document (segfault, OOM killer)
+                        del busy[conn]
+                        worker.kill()
+                        yield self._record(worker, 'crashed', worker.partial,
+                                           f"worker exited with code {worker.process.exitcode}")
+                        continue
+                    if kind == 'partial':
+                        worker.partial = payload
+                        continue
+                    del busy[conn]
+                    if kind == 'ok':
+                        result = self._record(worker, 'ok', payload)
+                    else:
+                        result = self._record(worker, 'error', error=payload)
+                    # Put the worker back before yielding, in case the caller stops iterating
+                    worker.docs += 1
+                    if worker.docs >= self.max_docs_per_worker:
+                        self.stats['recycled'] += 1
+                        worker.stop()
+                    else:
+                        self._idle.append(worker)
+                    yield result
+
+                for conn, worker in list(busy.items()):
+                    # A message already waiting (maybe the result) is read on the next round first
+                    reason = None if conn.poll() else self._check_limits(worker)
+                    if reason:
+                        del busy[conn]
+                        worker.kill()
+                        limit = f"{self.timeout:g}s" if reason == 'timeout' else f"{self.max_rss / 2**20:g} MB"
+                        yield self._record(worker, reason, worker.partial,
+                                           f"stopped after exceeding the {limit} limit")
+        finally:
+            for worker in busy.values():
+                worker.kill()
+
+    def analyze(self, source: PdfSource, name: str = None, **options) -> Dict[str, Any]:
+        """Analyze one document, reusing a warm worker if one is idle; returns its record."""
+        for _, record in self.imap_unordered([source], None if name is None else [name], options):
+            return record
+
+
+def analyze_isolated(sources: List[PdfSource], names: List[str] = None, **options) -> List[Dict[str, Any]]:
+    """
+    Analyze documents in isolated workers and return their records in input order.
+    Args:
+        sources (List[PdfSource]): Paths to PDF files, or their bytes.
+        names (List[str]): Values for the records' 'file' field.
+        **options: IsolatedAnalyzer options (workers, timeout, max_rss_mb, ...).
+    Returns:
+        List[Dict]: One record per document.
+    """
+    records = [None] * len(sources)
+    with IsolatedAnalyzer(**options) as analyzer:
+        for index, record in analyzer.imap_unordered(sources, names):
+            records[index] = record
+    return records
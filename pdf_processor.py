@@ -1,302 +1,1010 @@
 import pdfplumber
 import fitz  # PyMuPDF
 import re
-from typing import Dict, List, Tuple, Any
+from typing import Callable, Dict, Iterator, List, Tuple, Any, Union
+import bisect
+import difflib
+import io
+import logging
 import os
+import time
 
-def extract_text_from_pdf(file_path: str) -> str:
+logger = logging.getLogger(__name__)
+
+# Callables that receive one metrics dict per detector call, see add_metrics_sink
+_metrics_sinks = []
+
+
+def add_metrics_sink(sink: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Register a callable to receive detector metrics.
+    Each metric is a dict with 'method', 'file', 'seconds', 'pages', 'bytes'
+    and 'matches' (plus method-specific extras); 'scan' covers a whole document.
+    """
+    _metrics_sinks.append(sink)
+
+def remove_metrics_sink(sink: Callable[[Dict[str, Any]], None]) -> None:
+    """Unregister a sink added with add_metrics_sink."""
+    if sink in _metrics_sinks:
+        _metrics_sinks.remove(sink)
+
+def _record_metric(metric: Dict[str, Any]) -> None:
+    logger.debug("%s %s: %.4fs, %s pages, %s bytes, %s matches", metric['method'], metric.get('file'),
+                 metric['seconds'], metric.get('pages'), metric.get('bytes'), metric.get('matches'))
+    for sink in list(_metrics_sinks):
+        try:
+            sink(metric)
+        except Exception:
+            logger.exception("Metrics sink %r failed", sink)
+
+# A PDF given either as a path or as its raw bytes (e.g. an upload's getbuffer())
+PdfSource = Union[str, bytes, bytearray, memoryview]
+_BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+def open_pdf(source: PdfSource) -> fitz.Document:
+    """Open a PDF from a path, or straight from an in-memory buffer without copying it to disk."""
+    if isinstance(source, _BUFFER_TYPES):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def _source_label(source: PdfSource) -> str:
+    """Printable name for logs and metrics."""
+    if isinstance(source, _BUFFER_TYPES):
+        return f"<in-memory PDF, {_source_size(source)} bytes>"
+    return source
+
+def _source_size(source: Any) -> int:
+    """Size in bytes of the document being read, or None if unknown."""
+    if isinstance(source, memoryview):
+        return source.nbytes
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    try:
+        return os.path.getsize(source)
+    except (OSError, TypeError):
+        return None
+
+
+class MetricsAggregator:
+    """
+    Metrics sink that totals calls, time, pages and matches per method.
+    Register it with add_metrics_sink, or feed it the 'timings' of results
+    gathered from worker processes, then call report().
+    """
+
+    def __init__(self):
+        self.methods = {}
+
+    def __call__(self, metric: Dict[str, Any]) -> None:
+        totals = self.methods.setdefault(metric['method'], {
+            'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'pages': 0, 'bytes': 0, 'matches': 0
+        })
+        totals['calls'] += 1
+        totals['seconds'] += metric['seconds']
+        totals['max_seconds'] = max(totals['max_seconds'], metric['seconds'])
+        totals['pages'] += metric.get('pages') or 0
+        totals['bytes'] += metric.get('bytes') or 0
+        totals['matches'] += metric.get('matches') or 0
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-method totals with mean time and pages/sec."""
+        report = {}
+        for method, totals in sorted(self.methods.items()):
+            report[method] = {
+                **totals,
+                'seconds': round(totals['seconds'], 4),
+                'max_seconds': round(totals['max_seconds'], 4),
+                'mean_seconds': round(totals['seconds'] / totals['calls'], 4),
+                'pages_per_sec': round(totals['pages'] / totals['seconds'], 1) if totals['seconds'] else None,
+            }
+        return report
+
+# Text extraction backends. PyMuPDF is much faster; pdfplumber is kept for
+# documents where its layout-aware extraction reads better.
+DEFAULT_TEXT_BACKEND = 'pymupdf'
+
+
+# Annotation types that draw their own text; markup such as Highlight or
+# Underline sits over body text, which must stay
+TEXT_DRAWING_ANNOTATIONS = (fitz.PDF_ANNOT_FREE_TEXT, fitz.PDF_ANNOT_STAMP, fitz.PDF_ANNOT_TEXT, fitz.PDF_ANNOT_POPUP)
+
+
+def page_text(page: fitz.Page, widgets: List[fitz.Widget] = None) -> str:
     """
-    Extracts all text from a PDF file using pdfplumber.
+    Text of a page without the appearance text of its text-drawing annotations
+    (TEXT_DRAWING_ANNOTATIONS) and form fields. Those are reported by their own
+    methods; counting them again here would turn one FreeText annotation into
+    two independent findings. pdfplumber never reads appearance streams, so this
+    also keeps the two backends comparable.
     Args:
-        file_path (str): Path to the PDF file.
+        page (fitz.Page): The page.
+        widgets (List[fitz.Widget]): The page's widgets, if already listed.
+    Returns:
+        str: The page text.
+    """
+    if widgets is None:
+        widgets = list(page.widgets())
+    rects = [annot.rect for annot in page.annots(types=TEXT_DRAWING_ANNOTATIONS)] + [widget.rect for widget in widgets]
+    if not rects:
+        return page.get_text()
+    lines = {}
+    for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text("words"):
+        center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+        if not any(center in rect for rect in rects):
+            lines.setdefault((block_no, line_no), []).append(word)
+    return "".join(" ".join(words) + "\n" for words in lines.values())
+
+
+def _page_texts_pymupdf(source: PdfSource) -> List[str]:
+    with open_pdf(source) as doc:
+        return [page_text(page) for page in doc]
+
+
+def _page_texts_pdfplumber(source: PdfSource) -> List[str]:
+    with pdfplumber.open(io.BytesIO(source) if isinstance(source, _BUFFER_TYPES) else source) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+TEXT_BACKENDS = {
+    'pymupdf': _page_texts_pymupdf,
+    'pdfplumber': _page_texts_pdfplumber,
+}
+
+
+def extract_text_from_pdf(file_path: PdfSource, backend: str = DEFAULT_TEXT_BACKEND) -> str:
+    """
+    Extracts all text from a PDF file.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        backend (str): One of TEXT_BACKENDS ('pymupdf' or 'pdfplumber').
     Returns:
         str: The full extracted text from the PDF.
     """
+    if backend not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown text backend '{backend}', expected one of {sorted(TEXT_BACKENDS)}")
+    start = time.perf_counter()
     try:
-        text = ""
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        print(text)
-        return text.strip()
+        page_texts = TEXT_BACKENDS[backend](file_path)
+        text = "\n".join(text for text in page_texts if text).strip()
     except Exception as e:
-        print(f"❌ Error reading PDF '{file_path}': {e}")
+        logger.error("❌ Error reading PDF '%s': %s", _source_label(file_path), e)
         return ""
+    _record_metric({'method': 'extract_text', 'backend': backend, 'file': _source_label(file_path),
+                    'seconds': time.perf_counter() - start, 'pages': len(page_texts),
+                    'bytes': _source_size(file_path), 'matches': None, 'chars': len(text)})
+    return text
 
-def detect_signatures_multiple_methods(file_path: str) -> Dict[str, Any]:
+def compare_text_backends(file_path: PdfSource, backends: List[str] = None) -> Dict[str, Any]:
     """
-    Detect signatures using multiple methods and return comprehensive results.
+    Run several text backends on one PDF and report speed and text differences.
     Args:
-        file_path (str): Path to the PDF file.
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        backends (List[str]): Backends to compare, defaults to all of TEXT_BACKENDS.
     Returns:
-        Dict: Results from all detection methods.
+        Dict: Per-backend timing and size, plus pairwise similarity against the first backend
+              and whether each backend finds the same text indicators.
+    """
+    backends = backends or list(TEXT_BACKENDS)
+    report = {'file': _source_label(file_path), 'backends': {}, 'differences': {}}
+    texts = {}
+
+    for backend in backends:
+        start = time.perf_counter()
+        text = extract_text_from_pdf(file_path, backend)
+        elapsed = time.perf_counter() - start
+        texts[backend] = text
+        indicators = find_signature_text_indicators(text)
+        report['backends'][backend] = {
+            'seconds': round(elapsed, 4),
+            'chars': len(text),
+            'words': len(text.split()),
+            'indicator_matches': len(indicators['indicators']),
+            'date_matches': len(indicators['patterns']),
+        }
+
+    reference = backends[0]
+    reference_stats = report['backends'][reference]
+    for backend in backends[1:]:
+        stats = report['backends'][backend]
+        # Compare word sequences; character diffs mostly reflect whitespace layout
+        matcher = difflib.SequenceMatcher(None, texts[reference].split(), texts[backend].split(), autojunk=False)
+        report['differences'][f"{reference}_vs_{backend}"] = {
+            'word_similarity': round(matcher.ratio(), 4),
+            # how many times longer this backend took than the reference
+            'relative_time': round(stats['seconds'] / reference_stats['seconds'], 2) if reference_stats['seconds'] else None,
+            'same_verdict': bool(reference_stats['indicator_matches'] or reference_stats['date_matches']) ==
+                            bool(stats['indicator_matches'] or stats['date_matches']),
+        }
+
+    return report
+
+# Detector result keys, in the order the combined analysis reports them:
+# (signature_methods flag, details key).
+SIGNATURE_METHODS = [
+    ('digital_signature_fields', 'digital_signatures'),
+    ('form_fields', 'form_fields'),
+    ('text_indicators', 'text_indicators'),
+    ('annotations', 'annotations'),
+]
+
+# Methods that only run when asked for (see default_visitors); they count
+# towards confidence like the others when they do
+OPTIONAL_SIGNATURE_METHODS = [
+    ('visual_ink', 'visual_ink'),
+]
+
+# Field names containing any of these are treated as signature form fields
+SIGNATURE_FIELD_KEYWORDS = [
+    'signature', 'sign', 'signatory', 'signed', 'signer',
+    'docusign', 'adobe sign', 'hellosign', 'esignature',
+    'digital signature', 'electronic signature'
+]
+
+# Annotation content/title containing any of these marks a signature annotation
+SIGNATURE_ANNOTATION_INDICATORS = [
+    'signature', 'sign', 'signed', 'docusign', 'adobe sign',
+    'electronic', 'digital', 'certificate'
+]
+
+
+class PageVisitor:
     """
+    A detector that runs inside scan_document.
+    The scanner opens the document once and hands every visitor the same
+    page objects, so adding a detector does not add another pass over the file.
+    Subclasses set `name` to their details key and override the hooks they need.
+    """
+    name = ''
+    error_label = ''
+    uses_widgets = False
+    # Accumulated by the scanner for instrumentation
+    seconds = 0.0
+    pages_visited = 0
+
+    def begin(self, doc: fitz.Document) -> None:
+        """Called once with the open document before any page is visited."""
+
+    def visit_page(self, page_num: int, page: fitz.Page, widgets: List[Any]) -> None:
+        """Called once per page; `widgets` is the page's widget list, shared between visitors."""
+
+    def finish(self) -> Dict[str, Any]:
+        """Return the detector's result dict."""
+        raise NotImplementedError
+
+    def found(self) -> bool:
+        """Whether the visitor already has a finding; lets early-exit scans skip it."""
+        return self.result['found']
+
+    def extra_metrics(self) -> Dict[str, Any]:
+        """Detector-specific values added to this visitor's metrics."""
+        return {}
+
+
+class DigitalSignatureVisitor(PageVisitor):
+    """
+    Signature flags on the document plus signature-type widgets.
+    With verify_source, each signature is also checked cryptographically
+    (see signature_verifier) and the report is added under 'verification'.
+    """
+    name = 'digital_signatures'
+    error_label = 'digital signatures'
+    uses_widgets = True
+
+    def __init__(self, verify_source: PdfSource = None):
+        self.verify_source = verify_source
+        self.result = {'found': False, 'signatures': [], 'count': 0}
+
+    def begin(self, doc):
+        # Check if document has signature flags
+        sig_flags = doc.get_sigflags()
+        if sig_flags > 0:
+            self.result['found'] = True
+            self.result['sig_flags'] = sig_flags
+
+        if self.verify_source is not None:
+            from signature_verifier import find_signature_dictionaries, verify_signature_dictionaries
+            signatures = find_signature_dictionaries(doc)
+            self.result['verification'] = verify_signature_dictionaries(self.verify_source, signatures)
+            if signatures:
+                self.result['found'] = True
+
+    def visit_page(self, page_num, page, widgets):
+        for widget in widgets:
+            if widget.field_type == fitz.PDF_WIDGET_TYPE_SIGNATURE:
+                self.result['found'] = True
+                self.result['signatures'].append({
+                    'page': page_num + 1,
+                    'field_name': widget.field_name,
+                    'field_value': widget.field_value,
+                    'rect': widget.rect
+                })
+
+    def finish(self):
+        self.result['count'] = len(self.result['signatures'])
+        return self.result
+
+
+class FormFieldVisitor(PageVisitor):
+    """Form fields whose names look signature-related."""
+    name = 'form_fields'
+    error_label = 'signature form fields'
+    uses_widgets = True
+
+    def __init__(self):
+        self.result = {'found': False, 'fields': [], 'count': 0}
+
+    def visit_page(self, page_num, page, widgets):
+        for widget in widgets:
+            field_name = widget.field_name or ""
+            field_value = widget.field_value or ""
+
+            # Look for signature-related field names
+            if any(keyword in field_name.lower() for keyword in SIGNATURE_FIELD_KEYWORDS):
+                self.result['found'] = True
+                self.result['fields'].append({
+                    'page': page_num + 1,
+                    'field_name': field_name,
+                    'field_value': field_value,
+                    'field_type': widget.field_type_string,
+                    'rect': widget.rect
+                })
+
+    def finish(self):
+        self.result['count'] = len(self.result['fields'])
+        return self.result
+
+
+class TextIndicatorVisitor(PageVisitor):
+    """
+    Collects page text and runs the signature text patterns over it.
+    With the 'pymupdf' backend the text comes from the shared pages; any other
+    backend re-reads `source` itself once the scan finishes.
+    """
+    name = 'text_indicators'
+    error_label = 'signature text indicators'
+    uses_widgets = True
+
+    def __init__(self, backend: str = DEFAULT_TEXT_BACKEND, source: PdfSource = None, incremental: bool = False):
+        if backend not in TEXT_BACKENDS:
+            raise ValueError(f"Unknown text backend '{backend}', expected one of {sorted(TEXT_BACKENDS)}")
+        if backend != 'pymupdf' and source is None:
+            raise ValueError(f"The '{backend}' text backend needs the document source")
+        self.backend = backend
+        self.source = source
+        self.incremental = incremental
+        self.page_texts = []
+        self.extract_seconds = 0.0
+        self._found = False
+
+    def visit_page(self, page_num, page, widgets):
+        if self.backend != 'pymupdf':
+            return
+        start = time.perf_counter()
+        text = page_text(page, widgets)
+        self.extract_seconds += time.perf_counter() - start
+        if not text:
+            return
+        if self.incremental and not self._found:
+            # Match as pages arrive, with the previous page's tail so
+            # keyword/date pairs split across the page break still count
+            tail = self.page_texts[-1][-2 * DATE_PROXIMITY:] if self.page_texts else ""
+            self._found = find_signature_text_indicators(tail + "\n" + text)['found']
+        self.page_texts.append(text)
+
+    def found(self):
+        return self._found
+
+    def extra_metrics(self):
+        return {'backend': self.backend, 'extract_seconds': round(self.extract_seconds, 6)}
+
+    def finish(self):
+        if self.backend != 'pymupdf':
+            start = time.perf_counter()
+            text = extract_text_from_pdf(self.source, self.backend)
+            self.extract_seconds += time.perf_counter() - start
+            return find_signature_text_indicators(text)
+        return find_signature_text_indicators("\n".join(self.page_texts).strip())
+
+
+class AnnotationVisitor(PageVisitor):
+    """Stamp/FreeText/Text annotations that mention signing."""
+    name = 'annotations'
+    error_label = 'signature annotations'
+
+    def __init__(self):
+        self.result = {'found': False, 'annotations': [], 'count': 0}
+
+    def visit_page(self, page_num, page, widgets):
+        for annot in page.annots():
+            annot_type = annot.type[1]  # Get annotation type name
+            content = annot.info.get("content", "").lower()
+            title = annot.info.get("title", "").lower()
+
+            # Look for signature-related annotations
+            if (annot_type in ['Stamp', 'FreeText', 'Text'] and
+                any(indicator in content or indicator in title
+                    for indicator in SIGNATURE_ANNOTATION_INDICATORS)):
+
+                self.result['found'] = True
+                self.result['annotations'].append({
+                    'page': page_num + 1,
+                    'type': annot_type,
+                    'content': annot.info.get("content", ""),
+                    'title': annot.info.get("title", ""),
+                    'rect': annot.rect
+                })
+
+    def finish(self):
+        self.result['count'] = len(self.result['annotations'])
+        return self.result
+
+
+def default_visitors(source: PdfSource = None, text_backend: str = DEFAULT_TEXT_BACKEND,
+                     verify_signatures: bool = False, visual_ink_pages: int = 0) -> List[PageVisitor]:
+    """
+    Return a fresh visitor for each of the four detection methods, plus the
+    visual ink method (see ink_detector) when visual_ink_pages is positive.
+    """
+    visitors = [DigitalSignatureVisitor(source if verify_signatures else None), FormFieldVisitor(),
+                TextIndicatorVisitor(text_backend, source), AnnotationVisitor()]
+    if visual_ink_pages > 0:
+        from ink_detector import VisualInkVisitor
+        visitors.append(VisualInkVisitor(visual_ink_pages))
+    return visitors
+
+
+def scan_document(file_path: PdfSource, visitors: List[PageVisitor], early_exit: bool = False,
+                  stop_when: Callable[[], bool] = None, timings: Dict[str, Any] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Open a PDF once and run every visitor over each page in a single pass.
+    A visitor that raises is reported and dropped; the others keep going.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        visitors (List[PageVisitor]): Detectors to run.
+        early_exit (bool): Stop visiting pages for a visitor once it has a finding.
+        stop_when (Callable): Checked before each page; the scan ends when it returns True.
+        timings (Dict): If given, filled with each visitor's metrics plus 'scan'.
+    Returns:
+        Dict: Each visitor's result dict, keyed by visitor name.
+    """
+    start = time.perf_counter()
+    page_count = 0
+    try:
+        doc = open_pdf(file_path)
+    except Exception as e:
+        logger.error("❌ Error opening PDF '%s': %s", _source_label(file_path), e)
+        return {visitor.name: visitor.finish() for visitor in visitors}
+
+    try:
+        page_count = len(doc)
+        _visit_pages(doc, visitors, early_exit, stop_when)
+    finally:
+        doc.close()
+
+    return _finish_visitors(visitors, file_path, start, page_count, timings)
+
+
+def _finish_visitors(visitors: List[PageVisitor], source: Any, start: float, page_count: int,
+                     timings: Dict[str, Any] = None) -> Dict[str, Dict[str, Any]]:
+    """Collect visitor results and record per-visitor and whole-scan metrics."""
+    size = _source_size(source)
+    source = _source_label(source)
+    scanned = {}
+    metrics = {}
+    for visitor in visitors:
+        finish_start = time.perf_counter()
+        scanned[visitor.name] = visitor.finish()
+        visitor.seconds += time.perf_counter() - finish_start
+        metrics[visitor.name] = {
+            'method': visitor.name, 'file': source, 'seconds': visitor.seconds,
+            'pages': visitor.pages_visited, 'bytes': size,
+            'matches': count_matches(visitor.name, scanned[visitor.name]),
+            **visitor.extra_metrics(),
+        }
+    metrics['scan'] = {
+        'method': 'scan', 'file': source, 'seconds': time.perf_counter() - start, 'pages': page_count,
+        'bytes': size, 'matches': sum(m['matches'] for m in metrics.values()),
+    }
+
+    for metric in metrics.values():
+        _record_metric(metric)
+    if timings is not None:
+        timings.update(metrics)
+    return scanned
+
+
+def _visit_pages(doc: fitz.Document, visitors: List[PageVisitor], early_exit: bool = False,
+                 stop_when: Callable[[], bool] = None) -> None:
+    """Run `visitors` over the pages of an already open document."""
+    active = []
+    for visitor in visitors:
+        start = time.perf_counter()
+        try:
+            visitor.begin(doc)
+            active.append(visitor)
+        except Exception as e:
+            logger.error("❌ Error detecting %s: %s", visitor.error_label, e)
+        visitor.seconds += time.perf_counter() - start
+
+    for page_num in range(len(doc)):
+        if early_exit:
+            active = [visitor for visitor in active if not visitor.found()]
+        if not active or (stop_when and stop_when()):
+            break
+        page = doc[page_num]
+        # widgets() is a generator, so walk it once and share the list
+        widgets = list(page.widgets()) if any(v.uses_widgets for v in active) else []
+
+        for visitor in list(active):
+            start = time.perf_counter()
+            try:
+                visitor.visit_page(page_num, page, widgets)
+                visitor.pages_visited += 1
+            except Exception as e:
+                logger.error("❌ Error detecting %s: %s", visitor.error_label, e)
+                active.remove(visitor)
+            visitor.seconds += time.perf_counter() - start
+
+
+# Number of methods that must agree for each confidence level
+CONFIDENCE_THRESHOLDS = {'medium': 1, 'high': 2}
+
+
+def _combine_method_results(scanned: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold per-method results into the combined results dict."""
+    methods = SIGNATURE_METHODS + [(method, detail_key) for method, detail_key in OPTIONAL_SIGNATURE_METHODS
+                                   if detail_key in scanned]
     results = {
         'has_signatures': False,
-        'signature_methods': {
-            'digital_signature_fields': False,
-            'form_fields': False,
-            'text_indicators': False,
-            'annotations': False
-        },
+        'signature_methods': {method: False for method, _ in methods},
         'details': {},
         'confidence': 'low'
     }
-    
-    # Method 1: Check for digital signature fields using PyMuPDF
-    digital_sigs = detect_digital_signatures(file_path)
-    print(digital_sigs)
-    if digital_sigs['found']:
-        results['has_signatures'] = True
-        results['signature_methods']['digital_signature_fields'] = True
-        results['details']['digital_signatures'] = digital_sigs
-    
-    # Method 2: Check form fields for signature widgets
-    form_fields = detect_signature_form_fields(file_path)
-    print('method 2')
-    if form_fields['found']:
-        results['has_signatures'] = True
-        results['signature_methods']['form_fields'] = True
-        results['details']['form_fields'] = form_fields
-    
-    # Method 3: Text-based detection
-    text_indicators = detect_signature_text_indicators(file_path)
-    print('method 3')
-    if text_indicators['found']:
-        results['has_signatures'] = True
-        results['signature_methods']['text_indicators'] = True
-        results['details']['text_indicators'] = text_indicators
-    
-    # Method 4: Check annotations
-    annotations = detect_signature_annotations(file_path)
-    print('method 4')
-    if annotations['found']:
-        results['has_signatures'] = True
-        results['signature_methods']['annotations'] = True
-        results['details']['annotations'] = annotations
-    
+
+    for method, detail_key in methods:
+        method_result = scanned[detail_key]
+        if method_result['found']:
+            results['has_signatures'] = True
+            results['signature_methods'][method] = True
+            results['details'][detail_key] = method_result
+
     # Determine confidence level
     detection_count = sum(results['signature_methods'].values())
-    if detection_count >= 2:
+    if detection_count >= CONFIDENCE_THRESHOLDS['high']:
         results['confidence'] = 'high'
-    elif detection_count == 1:
+    elif detection_count >= CONFIDENCE_THRESHOLDS['medium']:
         results['confidence'] = 'medium'
-    
+
     return results
 
-def detect_digital_signatures(file_path: str) -> Dict[str, Any]:
+def detect_signatures_multiple_methods(file_path: PdfSource, text_backend: str = DEFAULT_TEXT_BACKEND,
+                                       mode: str = 'full', target_confidence: str = 'medium',
+                                       include_timings: bool = False, verify_signatures: bool = False,
+                                       visual_ink_pages: int = 0) -> Dict[str, Any]:
     """
-    Detect digital signatures using PyMuPDF.
+    Detect signatures using multiple methods and return comprehensive results.
+    All methods share one open document and one pass over its pages.
     Args:
-        file_path (str): Path to the PDF file.
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        text_backend (str): Text extraction backend for the text indicator method.
+        mode (str): 'full' runs every method to completion; 'verdict' stops as
+                    soon as target_confidence is reached (see detect_signature_verdict);
+                    'streaming' keeps memory bounded for very large PDFs
+                    (see detect_signatures_streaming, PyMuPDF text only).
+        target_confidence (str): 'medium' or 'high', used by verdict mode.
+        include_timings (bool): Add a 'timings' dict with each method's metrics.
+        verify_signatures (bool): Cryptographically verify digital signatures
+                                  (full mode only), see signature_verifier.
+        visual_ink_pages (int): Page budget for the visual ink method (full mode
+                                only), see ink_detector; 0 leaves it off.
     Returns:
-        Dict: Information about digital signatures found.
+        Dict: Results from all detection methods.
     """
-    result = {'found': False, 'signatures': [], 'count': 0}
-    
+    if mode == 'verdict':
+        return detect_signature_verdict(file_path, target_confidence, text_backend, include_timings)
+    if mode == 'streaming':
+        return detect_signatures_streaming(file_path, include_timings=include_timings)
+    if mode != 'full':
+        raise ValueError(f"Unknown mode '{mode}', expected 'full', 'verdict' or 'streaming'")
+
+    timings = {}
+    visitors = default_visitors(file_path, text_backend, verify_signatures, visual_ink_pages)
+    results = _combine_method_results(scan_document(file_path, visitors, timings=timings))
+    if include_timings:
+        results['timings'] = timings
+    return results
+
+def detect_signature_verdict(file_path: PdfSource, target_confidence: str = 'medium',
+                             text_backend: str = DEFAULT_TEXT_BACKEND, include_timings: bool = False) -> Dict[str, Any]:
+    """
+    Fast yes/no signature check that stops once target_confidence is reached.
+    Detectors run cheapest first: the document's signature flags, then one pass
+    over widgets and annotations, and only if that is not enough, a second pass
+    extracting text. Each detector also stops reading pages after its first hit.
+    `has_signatures` and `confidence` are reliable up to the target; `details`
+    only holds what was seen before stopping, so call
+    detect_signatures_multiple_methods for the full picture.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        target_confidence (str): 'medium' (one method) or 'high' (two methods).
+        text_backend (str): Text extraction backend for the last stage.
+        include_timings (bool): Add a 'timings' dict with each method's metrics.
+    Returns:
+        Dict: Combined results plus 'complete' (False) and 'methods_run'.
+    """
+    if target_confidence not in CONFIDENCE_THRESHOLDS:
+        raise ValueError(f"Unknown confidence '{target_confidence}', expected one of {sorted(CONFIDENCE_THRESHOLDS)}")
+    needed = CONFIDENCE_THRESHOLDS[target_confidence]
+
+    structural = [DigitalSignatureVisitor(), FormFieldVisitor(), AnnotationVisitor()]
+    text = TextIndicatorVisitor(text_backend, file_path, incremental=True)
+    visitors = structural + [text]
+    reached = lambda: sum(visitor.found() for visitor in visitors) >= needed
+    ran = list(structural)
+    start = time.perf_counter()
+    page_count = 0
+
     try:
-        doc = fitz.open(file_path)
-        
-        # Check if document has signature flags
-        sig_flags = doc.get_sigflags()
-        if sig_flags > 0:
-            print(f"found sig flags: {sig_flags}")
-            result['found'] = True
-            result['sig_flags'] = sig_flags
-        
-        # Look for signature fields
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            widgets = page.widgets()
-            
-            for widget in widgets:
-                if widget.field_type == fitz.PDF_WIDGET_TYPE_SIGNATURE:
-                    result['found'] = True
-                    result['signatures'].append({
-                        'page': page_num + 1,
-                        'field_name': widget.field_name,
-                        'field_value': widget.field_value,
-                        'rect': widget.rect
-                    })
-        
-        result['count'] = len(result['signatures'])
-        doc.close()
-        
+        doc = open_pdf(file_path)
+        try:
+            page_count = len(doc)
+            _visit_pages(doc, structural, early_exit=True, stop_when=reached)
+            if not reached():
+                ran.append(text)
+                _visit_pages(doc, [text], early_exit=True, stop_when=reached)
+        finally:
+            doc.close()
     except Exception as e:
-        print(f"❌ Error detecting digital signatures: {e}")
-    
-    return result
+        logger.error("❌ Error opening PDF '%s': %s", _source_label(file_path), e)
+
+    timings = {}
+    scanned = _finish_visitors(ran, file_path, start, page_count, timings)
+    if text not in ran:
+        scanned[text.name] = find_signature_text_indicators("")
 
-def detect_signature_form_fields(file_path: str) -> Dict[str, Any]:
+    results = _combine_method_results(scanned)
+    results['complete'] = False
+    results['methods_run'] = [visitor.name for visitor in ran]
+    if include_timings:
+        results['timings'] = timings
+    return results
+
+# Methods that only read document structure; cheap even on pathological files
+STRUCTURAL_METHODS = {'digital_signatures', 'form_fields', 'annotations'}
+
+def detect_signatures_staged(file_path: PdfSource, text_backend: str = DEFAULT_TEXT_BACKEND,
+                             on_partial: Callable[[Dict[str, Any]], None] = None, include_timings: bool = False,
+                             verify_signatures: bool = False, visual_ink_pages: int = 0) -> Dict[str, Any]:
+    """
+    Full-mode detection in two passes, reporting in between.
+    The structural methods run first and their combined result, marked
+    'complete': False with 'methods_run', is passed to on_partial; then text
+    extraction (where malformed PDFs stall) and visual ink run. The final
+    result is the same as detect_signatures_multiple_methods in full mode.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        text_backend (str): Text extraction backend.
+        on_partial (Callable): Receives the structural-only results.
+        include_timings (bool): Add a 'timings' dict with each method's metrics.
+        verify_signatures (bool): Cryptographically verify digital signatures.
+        visual_ink_pages (int): Page budget for the visual ink method; 0 leaves it off.
+    Returns:
+        Dict: Results from all detection methods.
+    """
+    timings = {}
+    visitors = default_visitors(file_path, text_backend, verify_signatures, visual_ink_pages)
+    structural = [visitor for visitor in visitors if visitor.name in STRUCTURAL_METHODS]
+    scanned = scan_document(file_path, structural, timings=timings)
+    if on_partial:
+        partial = _combine_method_results({**scanned, 'text_indicators': find_signature_text_indicators("")})
+        partial['complete'] = False
+        partial['methods_run'] = [visitor.name for visitor in structural]
+        on_partial(partial)
+
+    scanned.update(scan_document(file_path, [visitor for visitor in visitors if visitor not in structural],
+                                 timings=timings))
+    results = _combine_method_results(scanned)
+    if include_timings:
+        results['timings'] = timings
+    return results
+
+def detect_digital_signatures(file_path: PdfSource, verify: bool = False) -> Dict[str, Any]:
+    """
+    Detect digital signatures using PyMuPDF.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        verify (bool): Also check each signature cryptographically ('verification' key).
+    Returns:
+        Dict: Information about digital signatures found.
+    """
+    return scan_document(file_path, [DigitalSignatureVisitor(file_path if verify else None)])['digital_signatures']
+
+def detect_signature_form_fields(file_path: PdfSource) -> Dict[str, Any]:
     """
     Detect signature-related form fields.
     Args:
-        file_path (str): Path to the PDF file.
+        file_path (PdfSource): Path to the PDF file, or its bytes.
     Returns:
         Dict: Information about signature form fields found.
     """
-    result = {'found': False, 'fields': [], 'count': 0}
-    
-    try:
-        doc = fitz.open(file_path)
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            widgets = page.widgets()
-            
-            for widget in widgets:
-                field_name = widget.field_name or ""
-                field_value = widget.field_value or ""
+    return scan_document(file_path, [FormFieldVisitor()])['form_fields']
 
-                
-                # Look for signature-related field names
-                signature_keywords = [
-                    'signature', 'sign', 'signatory', 'signed', 'signer',
-                    'docusign', 'adobe sign', 'hellosign', 'esignature',
-                    'digital signature', 'electronic signature'
-                ]
-                
-                if any(keyword in field_name.lower() for keyword in signature_keywords):
-                    result['found'] = True
-                    result['fields'].append({
-                        'page': page_num + 1,
-                        'field_name': field_name,
-                        'field_value': field_value,
-                        'field_type': widget.field_type_string,
-                        'rect': widget.rect
-                    })
-        
-        result['count'] = len(result['fields'])
-        doc.close()
-        
-    except Exception as e:
-        print(f"❌ Error detecting signature form fields: {e}")
-    
-    return result
-
-def detect_signature_text_indicators(file_path: str) -> Dict[str, Any]:
+def detect_signature_text_indicators(file_path: PdfSource, text_backend: str = DEFAULT_TEXT_BACKEND) -> Dict[str, Any]:
     """
     Detect signatures based on text patterns commonly found in signed documents.
     Args:
-        file_path (str): Path to the PDF file.
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        text_backend (str): Text extraction backend, see TEXT_BACKENDS.
+    Returns:
+        Dict: Information about text-based signature indicators.
+    """
+    if text_backend != 'pymupdf':
+        return find_signature_text_indicators(extract_text_from_pdf(file_path, text_backend))
+    return scan_document(file_path, [TextIndicatorVisitor()])['text_indicators']
+
+# Common signature text patterns
+SIGNATURE_TEXT_PATTERNS = [
+    r'digitally signed by',
+    r'electronically signed',
+    r'signed on \d{1,2}/\d{1,2}/\d{4}',
+    r'docusign envelope id',
+    r'certificate information',
+    r'/s/\s*[A-Za-z\s]+',  # Common e-signature format
+    r'this document was signed',
+    r'signature valid',
+    r'signed with adobe sign',
+    r'hellosign',
+    r'signatory:',
+    r'signature date:',
+    r'digital signature',
+    r'electronic signature'
+]
+
+# All indicator patterns as one alternation inside a lookahead, so a single
+# scan reports every pattern at every start position (matches may overlap,
+# as they did when each pattern was searched separately).
+_INDICATOR_RE = re.compile(
+    '(?=' + '|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(SIGNATURE_TEXT_PATTERNS)) + ')',
+    re.IGNORECASE
+)
+
+_INDICATOR_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in SIGNATURE_TEXT_PATTERNS]
+
+# Dates as mm/dd/yyyy, mm-dd-yyyy or "Month d, yyyy"
+_DATE_RE = re.compile(r'\d{1,2}/\d{1,2}/\d{4}|\d{1,2}-\d{1,2}-\d{4}|\b\w+\s+\d{1,2},\s+\d{4}')
+
+# Signature keywords; the optional suffix makes each occurrence match once as
+# its longest form instead of once for 'sign' and again for 'signature'/'signed'.
+_KEYWORD_RE = re.compile(r'sign(?:ature|ed)?|date', re.IGNORECASE)
+
+# Dates must fall inside this many characters either side of a keyword
+DATE_PROXIMITY = 50
+
+
+def find_signature_text_indicators(text: str, min_end: int = 0) -> Dict[str, Any]:
+    """
+    Match signature text patterns and dates near signature keywords in extracted text.
+    Runs in one pass per regex: dates are indexed once, and each keyword hit
+    looks up the dates inside its window by position.
+    Args:
+        text (str): Document text.
+        min_end (int): Skip matches that end at or before this offset, i.e. that lie
+                       entirely in a prefix which was already searched (streaming overlap).
     Returns:
         Dict: Information about text-based signature indicators.
     """
     result = {'found': False, 'indicators': [], 'patterns': []}
-    
+    if not text:
+        return result
+
     try:
-        text = extract_text_from_pdf(file_path)
-        if not text:
-            return result
-        
-        # Common signature text patterns
-        signature_patterns = [
-            r'digitally signed by',
-            r'electronically signed',
-            r'signed on \d{1,2}/\d{1,2}/\d{4}',
-            r'docusign envelope id',
-            r'certificate information',
-            r'/s/\s*[A-Za-z\s]+',  # Common e-signature format
-            r'this document was signed',
-            r'signature valid',
-            r'signed with adobe sign',
-            r'hellosign',
-            r'signatory:',
-            r'signature date:',
-            r'digital signature',
-            r'electronic signature'
-        ]
-        
-        for pattern in signature_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                result['found'] = True
-                result['indicators'].append({
-                    'pattern': pattern,
-                    'match': match.group(),
-                    'position': match.span()
+        for match in _INDICATOR_RE.finditer(text):
+            group = match.lastgroup
+            index = int(group[1:])
+            if match.start(group) < min_end:
+                # Starts in the already-searched prefix: new only if it could
+                # not match there, e.g. a phrase split across the page break
+                if match.end(group) <= min_end or _INDICATOR_PATTERNS[index].match(text, match.start(group), min_end):
+                    continue
+            result['indicators'].append({
+                'pattern': SIGNATURE_TEXT_PATTERNS[index],
+                'match': match.group(group),
+                'position': match.span(group)
+            })
+
+        # Date-position index: starts are sorted because finditer scans left to right
+        dates = [(m.start(), m.end(), m.group()) for m in _DATE_RE.finditer(text)]
+        date_starts = [start for start, _, _ in dates]
+        seen = set()
+
+        for keyword_match in _KEYWORD_RE.finditer(text):
+            pos = keyword_match.start()
+            window_start = max(0, pos - DATE_PROXIMITY)
+            window_end = pos + DATE_PROXIMITY
+            keyword = keyword_match.group().lower()
+
+            i = bisect.bisect_left(date_starts, window_start)
+            while i < len(dates) and dates[i][0] < window_end:
+                date_start, date_end, date_text = dates[i]
+                i += 1
+                if date_end > window_end or (keyword, date_start) in seen:
+                    continue
+                if max(date_end, keyword_match.end()) <= min_end:
+                    continue
+                seen.add((keyword, date_start))
+                result['patterns'].append({
+                    'keyword': keyword,
+                    'date_pattern': date_text,
+                    'context': text[window_start:window_end].strip()
                 })
-        
-        # Look for date patterns near signature keywords
-        date_patterns = [
-            r'\d{1,2}/\d{1,2}/\d{4}',
-            r'\d{1,2}-\d{1,2}-\d{4}',
-            r'\w+\s+\d{1,2},\s+\d{4}'
-        ]
-        
-        signature_keywords = ['sign', 'signature', 'signed', 'date']
-        
-        for keyword in signature_keywords:
-            keyword_positions = [m.start() for m in re.finditer(keyword, text, re.IGNORECASE)]
-            
-            for pos in keyword_positions:
-                # Look for dates within 100 characters of signature keywords
-                nearby_text = text[max(0, pos-50):pos+50]
-                for date_pattern in date_patterns:
-                    date_matches = re.finditer(date_pattern, nearby_text)
-                    for date_match in date_matches:
-                        result['found'] = True
-                        result['patterns'].append({
-                            'keyword': keyword,
-                            'date_pattern': date_match.group(),
-                            'context': nearby_text.strip()
-                        })
-        
+
+        result['found'] = bool(result['indicators'] or result['patterns'])
+
     except Exception as e:
-        print(f"❌ Error detecting signature text indicators: {e}")
+        logger.error("❌ Error detecting signature text indicators: %s", e)
     
     return result
 
-def detect_signature_annotations(file_path: str) -> Dict[str, Any]:
+# Default number of matches kept per result list when streaming
+DEFAULT_MAX_MATCHES = 50
+
+# Result lists per method, as they appear in the details dicts
+METHOD_LIST_KEYS = {
+    'digital_signatures': ['signatures'],
+    'form_fields': ['fields'],
+    'text_indicators': ['indicators', 'patterns'],
+    'annotations': ['annotations'],
+    'visual_ink': ['regions'],
+}
+
+
+def count_matches(method: str, method_result: Dict[str, Any]) -> int:
+    """Number of entries across a method result's lists."""
+    return sum(len(method_result.get(list_key, [])) for list_key in METHOD_LIST_KEYS.get(method, []))
+
+
+def iter_signature_findings(file_path: PdfSource, overlap: int = 2 * DATE_PROXIMITY) -> Iterator[Dict[str, Any]]:
     """
-    Detect signature-related annotations.
+    Stream signature findings page by page without holding the document text.
+    The first event is document-level: {'page': 0, 'page_count', 'sig_flags', 'findings': {}}.
+    Every page then yields {'page': n, 'findings': {...}}, where findings hold only
+    that page's new matches, keyed like the details dicts (e.g.
+    findings['text_indicators']['patterns']). The last `overlap` characters of
+    text are carried into the next page so matches spanning a page break are
+    found exactly once; text positions are relative to the page start.
     Args:
-        file_path (str): Path to the PDF file.
-    Returns:
-        Dict: Information about signature annotations found.
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        overlap (int): Characters of text carried across page boundaries.
+    Yields:
+        Dict: One event per page.
     """
-    result = {'found': False, 'annotations': [], 'count': 0}
-    
+    digital, form, annots = DigitalSignatureVisitor(), FormFieldVisitor(), AnnotationVisitor()
+    item_lists = [
+        (digital, 'signatures', digital.result['signatures']),
+        (form, 'fields', form.result['fields']),
+        (annots, 'annotations', annots.result['annotations']),
+    ]
+
     try:
-        doc = fitz.open(file_path)
-        
+        doc = open_pdf(file_path)
+    except Exception as e:
+        logger.error("❌ Error opening PDF '%s': %s", _source_label(file_path), e)
+        return
+
+    try:
+        try:
+            digital.begin(doc)
+        except Exception as e:
+            logger.error("❌ Error detecting %s: %s", digital.error_label, e)
+        yield {'page': 0, 'page_count': len(doc), 'sig_flags': digital.result.get('sig_flags', 0), 'findings': {}}
+
+        tail = ""
         for page_num in range(len(doc)):
-            page = doc[page_num]
-            annotations = page.annots()
-            
-            for annot in annotations:
-                annot_type = annot.type[1]  # Get annotation type name
-                content = annot.info.get("content", "").lower()
-                title = annot.info.get("title", "").lower()
-                
-                # Look for signature-related annotations
-                signature_indicators = [
-                    'signature', 'sign', 'signed', 'docusign', 'adobe sign',
-                    'electronic', 'digital', 'certificate'
-                ]
-                
-                if (annot_type in ['Stamp', 'FreeText', 'Text'] and 
-                    any(indicator in content or indicator in title 
-                        for indicator in signature_indicators)):
-                    
-                    result['found'] = True
-                    result['annotations'].append({
-                        'page': page_num + 1,
-                        'type': annot_type,
-                        'content': annot.info.get("content", ""),
-                        'title': annot.info.get("title", ""),
-                        'rect': annot.rect
-                    })
-        
-        result['count'] = len(result['annotations'])
+            findings = {}
+            try:
+                page = doc[page_num]
+                widgets = list(page.widgets())
+                for visitor, list_key, items in item_lists:
+                    visitor.visit_page(page_num, page, widgets)
+                    if items:
+                        # hand the page's matches to the caller and keep nothing
+                        findings[visitor.name] = {list_key: items[:]}
+                        items.clear()
+
+                text_on_page = page_text(page, widgets)
+                text = f"{tail}\n{text_on_page}" if tail else text_on_page
+                offset = len(text) - len(text_on_page)
+                matched = find_signature_text_indicators(text, min_end=offset)
+                for indicator in matched['indicators']:
+                    start, end = indicator['position']
+                    indicator['position'] = (start - offset, end - offset)
+                    indicator['page'] = page_num + 1
+                for pattern in matched['patterns']:
+                    pattern['page'] = page_num + 1
+                if matched['found']:
+                    findings['text_indicators'] = {'indicators': matched['indicators'], 'patterns': matched['patterns']}
+                tail = text[-overlap:] if overlap else ""
+            except Exception as e:
+                logger.error("❌ Error scanning page %d of '%s': %s", page_num + 1, _source_label(file_path), e)
+            yield {'page': page_num + 1, 'findings': findings}
+    finally:
         doc.close()
-        
-    except Exception as e:
-        print(f"❌ Error detecting signature annotations: {e}")
-    
-    return result
+
+def detect_signatures_streaming(file_path: PdfSource, max_matches_per_method: int = DEFAULT_MAX_MATCHES,
+                                on_page: Callable[[Dict[str, Any]], None] = None,
+                                include_timings: bool = False) -> Dict[str, Any]:
+    """
+    Bounded-memory version of detect_signatures_multiple_methods for very large PDFs.
+    Consumes iter_signature_findings and keeps at most max_matches_per_method
+    entries in each result list; 'count' still reports the full number of
+    matches and 'truncated' marks lists that were capped.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+        max_matches_per_method (int): Entries retained per result list.
+        on_page (Callable): Called with each page event as it arrives, e.g. for progress.
+        include_timings (bool): Add a 'timings' dict with the whole-scan metrics.
+    Returns:
+        Dict: Results in the same shape as detect_signatures_multiple_methods.
+    """
+    start = time.perf_counter()
+    page_count = 0
+    scanned = {}
+    # Only the core methods stream; the optional ones are never run here
+    for _, method in SIGNATURE_METHODS:
+        list_keys = METHOD_LIST_KEYS[method]
+        scanned[method] = {'found': False, **{list_key: [] for list_key in list_keys}, 'count': 0, 'truncated': False}
+
+    for event in iter_signature_findings(file_path):
+        if event['page'] == 0 and event['sig_flags'] > 0:
+            scanned['digital_signatures']['found'] = True
+            scanned['digital_signatures']['sig_flags'] = event['sig_flags']
+
+        for method, lists in event['findings'].items():
+            method_result = scanned[method]
+            method_result['found'] = True
+            for list_key, items in lists.items():
+                method_result['count'] += len(items)
+                room = max_matches_per_method - len(method_result[list_key])
+                if len(items) > room:
+                    method_result['truncated'] = True
+                method_result[list_key].extend(items[:max(room, 0)])
+
+        page_count = event['page']
+        if on_page:
+            on_page(event)
+
+    scan_metric = {
+        'method': 'scan', 'file': _source_label(file_path), 'seconds': time.perf_counter() - start, 'pages': page_count,
+        'bytes': _source_size(file_path), 'matches': sum(m['count'] for m in scanned.values()),
+    }
+    _record_metric(scan_metric)
+
+    results = _combine_method_results(scanned)
+    if include_timings:
+        results['timings'] = {'scan': scan_metric}
+    return results
+
+def detect_signature_annotations(file_path: PdfSource) -> Dict[str, Any]:
+    """
+    Detect signature-related annotations.
+    Args:
+        file_path (PdfSource): Path to the PDF file, or its bytes.
+    Returns:
+        Dict: Information about signature annotations found.
+    """
+    return scan_document(file_path, [AnnotationVisitor()])['annotations']
+
+def results_json_default(obj: Any) -> Any:
+    """
+    `default=` hook for json.dump so results containing fitz.Rect and similar
+    geometry objects serialize as plain lists.
+    """
+    if isinstance(obj, (fitz.Rect, fitz.IRect, fitz.Point)):
+        return [float(v) for v in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    return str(obj)
 
 def analyze_pdf_signatures(file_path: str) -> None:
     """
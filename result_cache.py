@@ -0,0 +1,213 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+import pdf_processor
+
+# Default location and size bound for cached analysis results
+DEFAULT_CACHE_DIR = os.environ.get("PBSA_RESULT_CACHE_DIR", os.path.join("uploads", "result_cache"))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Detector modules beside pdf_processor.py that only run when their option is on
+_OPTION_MODULES = {
+    'verify_signatures': 'signature_verifier.py',
+    'visual_ink_pages': 'ink_detector.py',
+}
+
+
+def file_sha256(file_path: str) -> str:
+    """Return the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_sha256(source: pdf_processor.PdfSource) -> str:
+    """SHA-256 of a PDF given as a path or as in-memory bytes (hashed in place, no copy)."""
+    if isinstance(source, str):
+        return file_sha256(source)
+    return hashlib.sha256(source).hexdigest()
+
+
+def detector_fingerprint(**options) -> str:
+    """
+    Fingerprint of the detector code and the options it runs with.
+    Any edit to pdf_processor.py, or to signature_verifier.py / ink_detector.py
+    when verify_signatures / visual_ink_pages is on, changes the fingerprint, so
+    stale results are never served after the detectors change.
+    """
+    module_dir = os.path.dirname(os.path.abspath(pdf_processor.__file__))
+    sources = [pdf_processor.__file__] + [os.path.join(module_dir, module)
+                                          for option, module in sorted(_OPTION_MODULES.items()) if options.get(option)]
+    digest = hashlib.sha256()
+    for source in sources:
+        with open(source, "rb") as f:
+            digest.update(f.read())
+    for name in sorted(options):
+        digest.update(f"{name}={options[name]!r};".encode())
+    return digest.hexdigest()[:16]
+
+
+def analysis_options(text_backend: str = pdf_processor.DEFAULT_TEXT_BACKEND, mode: str = 'full',
+                     target_confidence: str = 'medium', include_timings: bool = False,
+                     verify_signatures: bool = False, visual_ink_pages: int = 0) -> Dict[str, Any]:
+    """The detector options that distinguish cached results; defaults are left out."""
+    options = {'text_backend': text_backend}
+    if mode != 'full':
+        options.update(mode=mode, target_confidence=target_confidence)
+    if include_timings:
+        options['include_timings'] = True
+    if verify_signatures:
+        options['verify_signatures'] = True
+    if visual_ink_pages:
+        options['visual_ink_pages'] = visual_ink_pages
+    return options
+
+
+class ResultCache:
+    """
+    On-disk cache of detect_signatures_multiple_methods results.
+    Entries are keyed by the SHA-256 of the PDF bytes plus the detector
+    fingerprint, stored one pickle per entry, and evicted least-recently-used
+    (by file mtime, which is bumped on every hit) once the directory grows
+    past max_bytes. Safe to share between threads and processes: entries are
+    written to a temp file and renamed into place.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def key_for(self, content_hash: str, **options) -> str:
+        """Build the cache key for a PDF's SHA-256 and the detector options."""
+        return f"{content_hash}_{detector_fingerprint(**options)}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached results for `key`, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                results = pickle.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return results
+
+    def put(self, key: str, results: Dict[str, Any]) -> None:
+        """Store results under `key`, then evict old entries if over the size bound."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, name in sorted(entries):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            if total <= self.max_bytes:
+                break
+
+    def analyze(self, file_path: pdf_processor.PdfSource, text_backend: str = pdf_processor.DEFAULT_TEXT_BACKEND,
+                mode: str = 'full', target_confidence: str = 'medium', include_timings: bool = False,
+                verify_signatures: bool = False, visual_ink_pages: int = 0) -> Dict[str, Any]:
+        """
+        Cached detect_signatures_multiple_methods.
+        Args:
+            file_path (PdfSource): Path to the PDF file, or its bytes.
+            text_backend (str): Text extraction backend, part of the cache key.
+            mode (str): 'full', 'verdict' or 'streaming', part of the cache key.
+            target_confidence (str): Verdict-mode target, part of the cache key.
+            include_timings (bool): Attach timings; cached timings describe the original run.
+            verify_signatures (bool): Cryptographically verify digital signatures, part of the cache key.
+            visual_ink_pages (int): Page budget for the visual ink method, part of the cache key.
+        Returns:
+            Dict: Results from all detection methods.
+        """
+        options = analysis_options(text_backend, mode, target_confidence, include_timings, verify_signatures,
+                                   visual_ink_pages)
+        key = self.key_for(content_sha256(file_path), **options)
+        results = self.get(key)
+        if results is None:
+            results = pdf_processor.detect_signatures_multiple_methods(file_path, text_backend, mode, target_confidence,
+                                                                       include_timings, verify_signatures, visual_ink_pages)
+            self.put(key, results)
+        return results
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        for _, _, name in self._entries():
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current size on disk."""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+_default_cache = None
+
+
+def get_default_cache() -> ResultCache:
+    """Process-wide cache shared by the Streamlit app and batch runs."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
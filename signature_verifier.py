@@ -0,0 +1,415 @@
+"""
+Cryptographic verification of PDF digital signatures.
+
+detect_digital_signatures only sees that a document claims to be signed.
+This module checks each signature dictionary (/ByteRange + /Contents): the
+signed byte ranges are hashed by streaming over a memory-mapped file, the
+digest is compared with the one the signer committed to, and the PKCS#7/CMS
+signature over it is checked against the signer's certificate.
+
+It answers "was this file changed since it was signed, and does the
+signature match the embedded certificate". It does not decide whether the
+certificate is trusted (no chain or revocation checks), so the signer and
+issuer are reported for the auditor to judge.
+
+    python signature_verifier.py evidence.pdf
+"""
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+from cachetools import LRUCache
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, padding, rsa, utils
+
+from pdf_processor import PdfSource, open_pdf
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# SubFilters whose /Contents is a detached CMS SignedData over the byte ranges
+CMS_SUBFILTERS = {'/adbe.pkcs7.detached', '/ETSI.CAdES.detached', '/adbe.pkcs7.sha1'}
+# Status of an intact, valid last signature with bytes appended after it
+MODIFIED_AFTER_SIGNING = 'valid_modified_after_signing'
+
+_OID_SIGNED_DATA = '1.2.840.113549.1.7.2'
+_OID_MESSAGE_DIGEST = '1.2.840.113549.1.9.4'
+_OID_SIGNING_TIME = '1.2.840.113549.1.9.5'
+_OID_RSASSA_PSS = '1.2.840.113549.1.1.10'
+
+# Digest algorithm OID -> (hashlib name, cryptography hash class)
+_DIGEST_ALGORITHMS = {
+    '1.3.14.3.2.26': ('sha1', hashes.SHA1),
+    '2.16.840.1.101.3.4.2.4': ('sha224', hashes.SHA224),
+    '2.16.840.1.101.3.4.2.1': ('sha256', hashes.SHA256),
+    '2.16.840.1.101.3.4.2.2': ('sha384', hashes.SHA384),
+    '2.16.840.1.101.3.4.2.3': ('sha512', hashes.SHA512),
+}
+
+# Parsed CMS facts keyed by the SHA-256 of the signature blob; the same
+# signature shows up again in re-uploads and re-saved copies of a document
+_cms_cache = LRUCache(maxsize=256)
+_cms_cache_lock = threading.Lock()
+
+
+# Minimal DER reader: only what is needed to walk a CMS SignedData
+
+def _der_item(data, offset: int):
+    """Return (tag, content_start, content_end) of the DER element at offset."""
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length == 0x80:
+        raise ValueError("BER indefinite-length encoding is not supported")
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("truncated DER element")
+    return tag, offset, offset + length
+
+
+def _der_children(data, start: int, end: int) -> List[tuple]:
+    """Elements inside a constructed value as (tag, content_start, content_end, element_start)."""
+    children = []
+    while start < end:
+        tag, content_start, content_end = _der_item(data, start)
+        children.append((tag, content_start, content_end, start))
+        start = content_end
+    return children
+
+
+def _der_oid(data: bytes) -> str:
+    first = min(data[0] // 40, 2)
+    parts = [str(first), str(data[0] - 40 * first)]
+    value = 0
+    for byte in data[1:]:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            parts.append(str(value))
+            value = 0
+    return '.'.join(parts)
+
+
+def _der_time(tag: int, data: bytes) -> Optional[str]:
+    """UTCTime / GeneralizedTime as an ISO string."""
+    text = data.decode('ascii').rstrip('Z')
+    try:
+        if tag == 0x17:
+            parsed = datetime.strptime(text, '%y%m%d%H%M%S')
+        else:
+            parsed = datetime.strptime(text.split('.')[0], '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=timezone.utc).isoformat()
+
+
+def _parse_cms(der: bytes) -> Dict[str, Any]:
+    """
+    Pull the first SignerInfo out of a CMS ContentInfo and check its signature
+    over the signed attributes. Nothing here depends on the PDF bytes, so the
+    outcome is cached per signature blob.
+    """
+    _, start, end = _der_item(der, 0)
+    content_type, explicit = _der_children(der, start, end)[:2]
+    if _der_oid(der[content_type[1]:content_type[2]]) != _OID_SIGNED_DATA:
+        raise ValueError("signature is not a CMS SignedData")
+    _, start, end = _der_item(der, explicit[1])
+    signed_data = _der_children(der, start, end)
+
+    certificates = []
+    for tag, start, end, _ in signed_data:
+        if tag == 0xa0:
+            certificates = [x509.load_der_x509_certificate(der[element:content_end])
+                            for child_tag, _, content_end, element in _der_children(der, start, end)
+                            if child_tag == 0x30]
+    signer_infos = signed_data[-1]
+    signer_info = _der_children(der, signer_infos[1], signer_infos[2])
+    if not signer_info:
+        raise ValueError("signature has no SignerInfo")
+    fields = _der_children(der, signer_info[0][1], signer_info[0][2])
+
+    sid = fields[1]
+    digest_oid = _der_oid(der[slice(*_der_children(der, fields[2][1], fields[2][2])[0][1:3])])
+    if digest_oid not in _DIGEST_ALGORITHMS:
+        raise ValueError(f"unsupported digest algorithm {digest_oid}")
+    index = 3
+    signed_attrs = None
+    if fields[index][0] == 0xa0:
+        signed_attrs = fields[index]
+        index += 1
+    signature_oid = _der_oid(der[slice(*_der_children(der, fields[index][1], fields[index][2])[0][1:3])])
+    signature = der[fields[index + 1][1]:fields[index + 1][2]]
+
+    # Signer certificate: issuer/serial or subject key identifier from the SignerInfo
+    signer = None
+    if sid[0] == 0x30:
+        serial_element = _der_children(der, sid[1], sid[2])[1]
+        serial = int.from_bytes(der[serial_element[1]:serial_element[2]], 'big', signed=True)
+        signer = next((cert for cert in certificates if cert.serial_number == serial), None)
+    else:
+        key_id = der[sid[1]:sid[2]]
+        for cert in certificates:
+            try:
+                if cert.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value.digest == key_id:
+                    signer = cert
+            except x509.ExtensionNotFound:
+                continue
+    if signer is None:
+        raise ValueError("signer certificate is not embedded in the signature")
+
+    facts = {
+        'digest_algorithm': _DIGEST_ALGORITHMS[digest_oid][0],
+        'signer': signer.subject.rfc4514_string(),
+        'issuer': signer.issuer.rfc4514_string(),
+        'serial': format(signer.serial_number, 'x'),
+        'certificate_not_before': signer.not_valid_before_utc.isoformat(),
+        'certificate_not_after': signer.not_valid_after_utc.isoformat(),
+        'signing_time': None,
+        'message_digest': None,
+        'signed_attributes': signed_attrs is not None,
+        # Kept for verifying signatures without signed attributes per document
+        '_public_key': signer.public_key(),
+        '_signature': signature,
+        '_signature_oid': signature_oid,
+    }
+
+    if signed_attrs is not None:
+        for _, start, end, _ in _der_children(der, signed_attrs[1], signed_attrs[2]):
+            oid_element, values = _der_children(der, start, end)[:2]
+            attribute_oid = _der_oid(der[oid_element[1]:oid_element[2]])
+            value_tag, value_start, value_end, _ = _der_children(der, values[1], values[2])[0]
+            if attribute_oid == _OID_MESSAGE_DIGEST:
+                facts['message_digest'] = der[value_start:value_end]
+            elif attribute_oid == _OID_SIGNING_TIME:
+                facts['signing_time'] = _der_time(value_tag, der[value_start:value_end])
+        if facts['message_digest'] is None:
+            raise ValueError("signed attributes carry no message digest")
+        # The signature covers the attributes DER-encoded as a SET, not with their [0] tag
+        attributes = b'\x31' + der[signed_attrs[3] + 1:signed_attrs[2]]
+        facts['signature_valid'] = _check_signature(facts, attributes)
+    return facts
+
+
+def _check_signature(facts: Dict[str, Any], data: bytes, prehashed: bool = False) -> bool:
+    """Check facts' signature over data (or over a digest already computed, if prehashed)."""
+    public_key = facts['_public_key']
+    hash_algorithm = dict(_DIGEST_ALGORITHMS.values())[facts['digest_algorithm']]()
+    algorithm = utils.Prehashed(hash_algorithm) if prehashed else hash_algorithm
+    try:
+        if isinstance(public_key, rsa.RSAPublicKey):
+            if facts['_signature_oid'] == _OID_RSASSA_PSS:
+                scheme = padding.PSS(mgf=padding.MGF1(hash_algorithm), salt_length=padding.PSS.AUTO)
+            else:
+                scheme = padding.PKCS1v15()
+            public_key.verify(facts['_signature'], data, scheme, algorithm)
+        elif isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(facts['_signature'], data, ec.ECDSA(algorithm))
+        elif isinstance(public_key, (ed25519.Ed25519PublicKey, ed448.Ed448PublicKey)) and not prehashed:
+            public_key.verify(facts['_signature'], data)
+        else:
+            raise ValueError(f"unsupported signer key type {type(public_key).__name__}")
+    except InvalidSignature:
+        return False
+    return True
+
+
+def _cms_facts(der: bytes) -> Dict[str, Any]:
+    key = hashlib.sha256(der).hexdigest()
+    with _cms_cache_lock:
+        facts = _cms_cache.get(key)
+    if facts is None:
+        facts = _parse_cms(der)
+        with _cms_cache_lock:
+            _cms_cache[key] = facts
+    return facts
+
+
+def clear_cache() -> None:
+    """Forget parsed signatures."""
+    with _cms_cache_lock:
+        _cms_cache.clear()
+
+
+def find_signature_dictionaries(doc) -> List[Dict[str, Any]]:
+    """
+    Locate every signature dictionary (any object with a /ByteRange) in an open document.
+    Args:
+        doc (fitz.Document): Open document.
+    Returns:
+        List[Dict]: One entry per signature with its xref, byte range and descriptive keys.
+    """
+    signatures = []
+    for xref in range(1, doc.xref_length()):
+        kind, value = doc.xref_get_key(xref, "ByteRange")
+        if kind != 'array':
+            continue
+        signature = {'xref': xref, 'byte_range': [int(v) for v in value.strip('[]').split()]}
+        for key in ('SubFilter', 'Name', 'Reason', 'M'):
+            kind, value = doc.xref_get_key(xref, key)
+            signature[key.lower()] = None if kind == 'null' else value
+        signatures.append(signature)
+    return signatures
+
+
+def _hash_ranges(view: memoryview, byte_range: List[int], algorithm: str) -> bytes:
+    """Digest the signed byte ranges a chunk at a time, reading straight from the buffer."""
+    digest = hashlib.new(algorithm)
+    for start, length in zip(byte_range[::2], byte_range[1::2]):
+        for offset in range(start, start + length, _HASH_CHUNK_SIZE):
+            digest.update(view[offset:min(offset + _HASH_CHUNK_SIZE, start + length)])
+    return digest.digest()
+
+
+def _signature_contents(view: memoryview, byte_range: List[int]) -> bytes:
+    """The hex /Contents string sits in the gap between the two signed ranges."""
+    gap = bytes(view[byte_range[0] + byte_range[1]:byte_range[2]]).strip()
+    if not (gap.startswith(b'<') and gap.endswith(b'>')):
+        raise ValueError("/Contents is not a hex string between the signed ranges")
+    der = bytes.fromhex(gap[1:-1].decode('ascii'))
+    # /Contents is zero-padded to a reserved size; keep just the DER element
+    _, _, end = _der_item(der, 0)
+    return der[:end]
+
+
+def verify_signature(view: memoryview, signature: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Verify one signature dictionary against the document bytes.
+    Args:
+        view (memoryview): The whole PDF file.
+        signature (Dict): Entry from find_signature_dictionaries.
+    Returns:
+        Dict: The entry plus 'status' ('valid', 'invalid', 'unsupported' or 'error'; see
+              verify_signature_dictionaries for MODIFIED_AFTER_SIGNING),
+              'intact' (signed bytes unchanged), 'signature_valid', 'covers_whole_file'
+              and the signer certificate details.
+    """
+    byte_range = signature['byte_range']
+    result = {**signature, 'status': 'error', 'intact': None, 'signature_valid': None,
+              'covers_whole_file': None}
+    try:
+        if len(byte_range) != 4 or byte_range[0] != 0 or byte_range[2] + byte_range[3] > len(view):
+            raise ValueError(f"malformed /ByteRange {byte_range}")
+        # False means content was appended after signing (an incremental update)
+        result['covers_whole_file'] = byte_range[2] + byte_range[3] == len(view)
+        if signature.get('subfilter') not in CMS_SUBFILTERS:
+            result['status'] = 'unsupported'
+            return result
+
+        facts = _cms_facts(_signature_contents(view, byte_range))
+        result.update({key: value for key, value in facts.items()
+                       if not key.startswith('_') and key not in ('message_digest', 'signed_attributes')})
+        digest = _hash_ranges(view, byte_range, facts['digest_algorithm'])
+        if facts['signed_attributes']:
+            result['intact'] = digest == facts['message_digest']
+        else:
+            # Without signed attributes the signature is made over the content digest itself
+            result['signature_valid'] = result['intact'] = _check_signature(facts, digest, prehashed=True)
+        result['status'] = 'valid' if result['intact'] and result['signature_valid'] else 'invalid'
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+@contextmanager
+def _mapped(source: PdfSource):
+    """Yield the PDF as a memoryview: an mmap of the file, or the caller's buffer as is."""
+    if not isinstance(source, str):
+        with memoryview(source) as view:
+            yield view.cast('B')
+        return
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b'')
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+
+
+def verify_signature_dictionaries(source: PdfSource, signatures: List[Dict[str, Any]],
+                                  max_workers: int = None) -> Dict[str, Any]:
+    """
+    Verify already-located signatures; several run concurrently on a thread pool
+    (hashing and the crypto primitives release the GIL).
+    Args:
+        source (PdfSource): Path to the PDF file, or its bytes.
+        signatures (List[Dict]): Entries from find_signature_dictionaries.
+        max_workers (int): Thread pool size, defaults to the number of cores.
+    Returns:
+        Dict: {'count', 'valid', 'invalid', 'modified_after_signing', 'all_valid', 'signatures': [...]}.
+              A valid last signature that does not reach the end of the file gets the
+              status MODIFIED_AFTER_SIGNING and is not counted in 'valid' or 'all_valid'.
+    """
+    with _mapped(source) as view:
+        if len(signatures) > 1:
+            workers = min(len(signatures), max_workers or os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify-signature") as pool:
+                verified = list(pool.map(lambda signature: verify_signature(view, signature), signatures))
+        else:
+            verified = [verify_signature(view, signature) for signature in signatures]
+
+    # Earlier signatures are followed by later revisions by design; only bytes after the
+    # last signature are unsigned changes (an incremental update can alter what the page shows)
+    well_formed = [result for result in verified if len(result['byte_range']) == 4]
+    if well_formed:
+        last = max(well_formed, key=lambda result: result['byte_range'][2] + result['byte_range'][3])
+        if last['status'] == 'valid' and last['covers_whole_file'] is False:
+            last['status'] = MODIFIED_AFTER_SIGNING
+
+    valid = sum(result['status'] == 'valid' for result in verified)
+    return {
+        'count': len(verified),
+        'valid': valid,
+        'invalid': sum(result['status'] == 'invalid' for result in verified),
+        'modified_after_signing': any(result['status'] == MODIFIED_AFTER_SIGNING for result in verified),
+        'all_valid': bool(verified) and valid == len(verified),
+        'signatures': verified,
+    }
+
+
+def verify_pdf_signatures(source: PdfSource, max_workers: int = None) -> Dict[str, Any]:
+    """
+    Find and verify every signature in a PDF.
+    Args:
+        source (PdfSource): Path to the PDF file, or its bytes.
+        max_workers (int): Thread pool size for documents with several signatures.
+    Returns:
+        Dict: See verify_signature_dictionaries.
+    """
+    doc = open_pdf(source)
+    try:
+        signatures = find_signature_dictionaries(doc)
+    finally:
+        doc.close()
+    return verify_signature_dictionaries(source, signatures, max_workers)
+
+
+def main(argv: List[str] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python signature_verifier.py FILE.pdf [FILE.pdf ...]", file=sys.stderr)
+        return 2
+    exit_code = 0
+    for file_path in argv:
+        report = verify_pdf_signatures(file_path)
+        print(json.dumps({'file': file_path, **report}, indent=2))
+        if report['count'] and not report['all_valid']:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())